@@ -0,0 +1,202 @@
+# prompt building, slot compaction, answer caching and latency tracking for
+# the scheduling assistant
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+ASSISTANT_CACHE_SIZE = int(os.environ.get("ASSISTANT_CACHE_SIZE", "256"))
+ASSISTANT_CACHE_TTL = float(os.environ.get("ASSISTANT_CACHE_TTL", "600"))
+
+SYSTEM_PROMPT = """
+You are a helpful scheduling assistant for the 'Makeup' app used by Iqra University Faculty to book makeup classes. Be conversational, brief, and actionable. Do not reply in markdown. Always reply in normal English.
+
+IMPORTANT INSTRUCTIONS:
+- Only provide free slots or recommendations when the user **explicitly asks** for them (e.g., 'available slots', 'free time', 'recommend a time').
+- If the user is just greeting or making small talk (like 'hello', 'hi'), respond naturally without suggesting slots.
+- Keep responses concise: 2-3 sentences maximum.
+- Be direct and helpful, not robotic.
+- When providing slots, focus on GREEN status slots (most students available).
+
+DATA EXPLANATION:
+- GREEN status = Most students (50%+) can attend — RECOMMEND these
+- RED status = Most students have conflicts — AVOID these
+- Each room number (like "14", "36", "23") has different available time slots
+
+RESPONSE STYLE:
+✅ Good: "I found 3 great options! Room 36 has slots from 08:00-11:00 and 11:00-14:00. Room 30 is also free from 11:00-14:00."
+❌ Bad: Responding with slot suggestions when the user did not ask for availability.
+
+Only suggest slots **if the user asks about available times**.
+
+Available Data:
+{free_slots_info}
+"""
+
+
+# rough token estimate (~4 characters per token for english / json)
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def _room_order(room):
+    return (0, int(room), "") if str(room).isdigit() else (1, 0, str(room))
+
+def _pick(row, *names):
+    for name in names:
+        if name in row:
+            return row[name]
+    return None
+
+def encode_free_slots(free_slots_info):
+    # groups rooms by status and time range, e.g.
+    #   GREEN 08:00-11:00: rooms 14, 36
+    # anything that doesn't look like slot rows falls back to compact json
+    data = free_slots_info
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return data
+    groups = {}
+    try:
+        for room_entry in data:
+            for room, rows in room_entry.items():
+                for row in rows:
+                    start = _pick(row, "start_time", "slot_start", "start")
+                    end = _pick(row, "end_time", "slot_end", "end")
+                    status = _pick(row, "status", "slot_status")
+                    if start is None or end is None or status is None:
+                        raise ValueError(row)
+                    groups.setdefault((str(status).upper(), str(start)[:5], str(end)[:5]), set()).add(str(room))
+    except (AttributeError, TypeError, ValueError):
+        return json.dumps(data, separators=(",", ":"), sort_keys=True, default=str)
+    if not groups:
+        return "No free slots."
+    lines = []
+    status_order = {"GREEN": 0, "RED": 1}
+    for status, start, end in sorted(groups, key=lambda g: (status_order.get(g[0], 2), g[0], g[1], g[2])):
+        rooms = sorted(groups[(status, start, end)], key=_room_order)
+        lines.append(f"{status} {start}-{end}: rooms {', '.join(rooms)}")
+    return "\n".join(lines)
+
+
+def build_messages(history, user_message, free_slots_info):
+    system_prompt = {
+        "role": "system",
+        "content": SYSTEM_PROMPT.format(free_slots_info=free_slots_info),
+    }
+    return (
+        [system_prompt] +
+        history +
+        [{"role": "user", "content": user_message}]
+    )
+
+
+def normalise_question(message):
+    # casefold + \w keep non latin questions apart instead of reducing them to ""
+    return " ".join(re.sub(r"[^\w:]+", " ", str(message or "").casefold()).split())
+
+
+class AnswerCache:
+    # bounded lru keyed by (normalised question, hash of the compact slot data,
+    # hash of the history), so follow ups like "yes" only match the same chat
+    def __init__(self, max_entries=ASSISTANT_CACHE_SIZE, ttl=ASSISTANT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.raw_tokens = 0
+        self.compact_tokens = 0
+        self._lock = threading.Lock()
+
+    def key(self, message, compact_slots, history=()):
+        question = normalise_question(message)
+        if not question:
+            # nothing left to tell questions apart by, so it isn't cached
+            return None
+        context = json.dumps(history, separators=(",", ":"), sort_keys=True, default=str)
+        return (question, hashlib.sha1(compact_slots.encode()).hexdigest(), hashlib.sha1(context.encode()).hexdigest())
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, answer):
+        if key is None:
+            return
+        with self._lock:
+            self.entries[key] = (time.monotonic() + self.ttl, answer)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def record_compaction(self, raw, compact):
+        with self._lock:
+            self.raw_tokens += estimate_tokens(raw)
+            self.compact_tokens += estimate_tokens(compact)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "slot_tokens_raw": self.raw_tokens,
+            "slot_tokens_compact": self.compact_tokens,
+            "slot_tokens_saved": self.raw_tokens - self.compact_tokens,
+        }
+
+
+class CompletionStats:
+    def __init__(self):
+        self.completions = 0
+        self.streams = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.ttft_total = 0.0
+        self.ttft_max = 0.0
+        self.duration_total = 0.0
+        self._lock = threading.Lock()
+
+    def record_completion(self, seconds):
+        with self._lock:
+            self.completions += 1
+            self.duration_total += seconds
+
+    def record_first_token(self, seconds):
+        with self._lock:
+            self.streams += 1
+            self.ttft_total += seconds
+            self.ttft_max = max(self.ttft_max, seconds)
+
+    def record_cancelled(self):
+        with self._lock:
+            self.cancelled += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def stats(self):
+        return {
+            "completions": self.completions,
+            "avg_completion_ms": self.duration_total / self.completions * 1000 if self.completions else 0.0,
+            "streams": self.streams,
+            "avg_time_to_first_token_ms": self.ttft_total / self.streams * 1000 if self.streams else 0.0,
+            "max_time_to_first_token_ms": self.ttft_max * 1000,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+        }
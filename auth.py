@@ -0,0 +1,158 @@
+# short lived signed session tokens, checked with a single hmac so bcrypt
+# only runs once per login. with CACHE_REDIS_URL set revocations live in redis
+# and /logout reaches every worker; without it they are per process, which
+# only works with a single worker
+import os
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import secrets
+import threading
+from typing import Optional
+from fastapi import Header, HTTPException
+
+# every worker and cold start has to sign with the same secret, a random one
+# per process would turn tokens from another instance into 401s
+SESSION_SECRET = os.environ.get("SESSION_SECRET", "").encode()
+if not SESSION_SECRET:
+    raise RuntimeError("SESSION_SECRET is not set, session tokens can't be signed")
+SESSION_TTL = int(os.environ.get("SESSION_TTL", "3600"))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+
+logger = logging.getLogger("auth")
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+class RedisRevocations:
+    # needs the redis package, calls block so they run on a worker thread.
+    # every key expires once the tokens it revokes would have anyway
+    prefix = "makeup-revoked:"
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+
+    def revoke_token(self, jti, exp):
+        self.redis.set(self.prefix + "token:" + jti, 1, ex=max(1, int(exp - time.time())))
+
+    def revoke_user(self, p_id, revoked_at):
+        self.redis.set(self.prefix + "user:" + p_id, revoked_at, ex=SESSION_TTL)
+
+    def lookup(self, jti, p_id):
+        token, user = self.redis.mget(self.prefix + "token:" + jti, self.prefix + "user:" + p_id)
+        return token is not None, float(user) if user is not None else None
+
+
+class TokenRevocations:
+    # revoked token ids are kept only until they would have expired anyway
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.tokens = {}
+        self.users = {}
+        self._lock = threading.Lock()
+
+    async def revoke_token(self, jti, exp):
+        with self._lock:
+            self.tokens[jti] = exp
+            self._prune()
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.revoke_token, jti, exp)
+            except Exception as e:
+                logger.warning("shared token revocation failed: %s", e)
+
+    async def revoke_user(self, p_id):
+        # every token issued for this user before now stops working
+        revoked_at = time.time()
+        with self._lock:
+            self.users[p_id] = revoked_at
+            self._prune()
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.revoke_user, p_id, revoked_at)
+            except Exception as e:
+                logger.warning("shared user revocation failed: %s", e)
+
+    async def is_revoked(self, claims):
+        token_revoked = claims["jti"] in self.tokens
+        revoked_at = self.users.get(claims["sub"])
+        if self.backend is not None and not token_revoked:
+            try:
+                token_revoked, shared_at = await asyncio.to_thread(self.backend.lookup, claims["jti"], claims["sub"])
+                revoked_at = max(revoked_at or 0, shared_at or 0) or None
+            except Exception as e:
+                # what this worker revoked itself still applies
+                logger.warning("shared revocation lookup failed: %s", e)
+        return token_revoked or (revoked_at is not None and claims["iat"] <= revoked_at)
+
+    def _prune(self):
+        now = time.time()
+        for jti in [jti for jti, exp in self.tokens.items() if exp < now]:
+            del self.tokens[jti]
+        # tokens issued before a user revocation are all expired by now
+        for p_id in [p_id for p_id, revoked_at in self.users.items() if revoked_at + SESSION_TTL < now]:
+            del self.users[p_id]
+
+
+def create_revocations():
+    backend = None
+    if CACHE_REDIS_URL:
+        try:
+            backend = RedisRevocations(CACHE_REDIS_URL)
+        except Exception as e:
+            logger.warning("shared revocations disabled, /logout only reaches this worker: %s", e)
+    return TokenRevocations(backend=backend)
+
+
+revocations = create_revocations()
+
+
+def issue_token(p_id: str):
+    now = time.time()
+    claims = {"sub": p_id, "iat": now, "exp": int(now) + SESSION_TTL, "jti": secrets.token_hex(8)}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}", SESSION_TTL
+
+def decode_token(token: str) -> Optional[dict]:
+    try:
+        payload, signature = token.split(".")
+    except ValueError:
+        return None
+    # bytes, compare_digest refuses str with non-ascii characters
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+# dependencies, async so the check stays on the event loop instead of a
+# threadpool hop per request
+async def session_claims(authorization: Optional[str] = Header(None)) -> dict:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Missing session token.")
+    claims = decode_token(authorization[7:].strip())
+    if claims is None or await revocations.is_revoked(claims):
+        raise HTTPException(status_code=401, detail="Invalid or expired session token.")
+    return claims
+
+def require_owner(claims: dict, p_id: str):
+    if claims["sub"] != p_id:
+        raise HTTPException(status_code=403, detail="Session does not belong to this teacher.")
@@ -0,0 +1,234 @@
+# in-process free slot engine. every room's day and every student's day is a
+# uint64 bitset of time slots, so free windows and the GREEN/RED share of
+# available students for all rooms come out of one vectorized numpy pass
+import os
+import time
+import asyncio
+import numpy as np
+
+DAY_START = os.environ.get("AVAILABILITY_DAY_START", "08:00")
+DAY_END = os.environ.get("AVAILABILITY_DAY_END", "20:00")
+SLOT_MINUTES = int(os.environ.get("AVAILABILITY_SLOT_MINUTES", "30"))
+AVAILABILITY_TTL = float(os.environ.get("AVAILABILITY_TTL", "300"))
+GREEN_SHARE = 0.5
+
+
+def to_minutes(value):
+    hours, minutes = str(value).split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+def to_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class SlotGrid:
+    def __init__(self, day_start=DAY_START, day_end=DAY_END, slot_minutes=SLOT_MINUTES):
+        self.start = to_minutes(day_start)
+        self.end = to_minutes(day_end)
+        self.slot = slot_minutes
+        self.slots = (self.end - self.start) // slot_minutes
+        if self.slots > 64:
+            raise ValueError("a day must fit in 64 slots, use a bigger AVAILABILITY_SLOT_MINUTES")
+
+    def mask(self, start_time, end_time):
+        # bits for every slot the interval touches, clipped to the day
+        first = max(0, (to_minutes(start_time) - self.start) // self.slot)
+        last = min(self.slots, -(-(to_minutes(end_time) - self.start) // self.slot))
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def windows(self, duration):
+        # candidate makeup windows: back to back blocks of the course length
+        starts = range(self.start, self.end - duration + 1, duration)
+        return [(to_time(start), to_time(start + duration)) for start in starts]
+
+
+class AvailabilityEngine:
+    def __init__(self, repo, roster, grid=None, ttl=AVAILABILITY_TTL, versions=None):
+        self.repo = repo
+        self.roster = roster
+        self.grid = grid or SlotGrid()
+        self.ttl = ttl
+        # the data versions behind the free slot etags (versions.py)
+        self.versions = versions
+        self.loaded_at = None
+        # day -> data version the bitsets reflect
+        self.day_versions = {}
+        self.rooms = []
+        self.days = {}
+        self.room_index = {}
+        self.room_bits = np.zeros((0, 0), dtype=np.uint64)
+        self.student_index = {}
+        self.student_bits = np.zeros((0, 0), dtype=np.uint64)
+        # (room, day) -> reserved intervals, so a release can rebuild one cell
+        self.reservations = {}
+        self._lock = asyncio.Lock()
+
+    def _day(self, day):
+        index = self.days.get(day)
+        if index is None:
+            index = self.days[day] = len(self.days)
+            self.room_bits = np.pad(self.room_bits, ((0, 0), (0, 1)))
+            self.student_bits = np.pad(self.student_bits, ((0, 0), (0, 1)))
+        return index
+
+    def _room(self, lr):
+        index = self.room_index.get(lr)
+        if index is None:
+            self.rooms.append(lr)
+            self.room_bits = np.pad(self.room_bits, ((0, 1), (0, 0)))
+            # rooms stay in sorted order, like the rpc path returns them
+            order = sorted(range(len(self.rooms)), key=lambda i: str(self.rooms[i]))
+            self.rooms = [self.rooms[i] for i in order]
+            self.room_bits = self.room_bits[order]
+            self.room_index = {room: i for i, room in enumerate(self.rooms)}
+            index = self.room_index[lr]
+        return index
+
+    def _current(self, day, version):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl:
+            return False
+        # bookings on other workers move the shared day version without
+        # reaching these bitsets. an unreadable version can't tell, the ttl
+        # still bounds how stale they get then
+        return day is None or not isinstance(version, int) or self.day_versions.get(day, -1) >= version
+
+    async def ensure_loaded(self, day=None, version=None):
+        if self._current(day, version):
+            return
+        async with self._lock:
+            if not self._current(day, version):
+                await self.load(day)
+
+    async def load(self, day=None):
+        # versions are read before the tables, so the bitsets are at least as
+        # new as the versions they are recorded under
+        known_days = sorted(set(self.days) | ({day} if day is not None else set()))
+        seen = {}
+        if self.versions is not None:
+            seen = dict(zip(known_days, await asyncio.gather(*[self.versions.day(known) for known in known_days])))
+        # the roster is re-read too, so enrollment changes show up every reload
+        reserved, courses, _ = await asyncio.gather(self.repo.get_reservations(), self.repo.get_all_courses(), self.roster.load())
+        self.rooms, self.days, self.room_index, self.reservations = [], {}, {}, {}
+        self.room_bits = np.zeros((0, 0), dtype=np.uint64)
+        self.student_bits = np.zeros((0, 0), dtype=np.uint64)
+
+        # only rooms that show up in lr_reserved are offered, like the rpc path
+        listed = sorted({row["lr"] for row in reserved}, key=str)
+        for lr in listed:
+            self._room(lr)
+        for row in reserved + courses:
+            if row.get("lr") in self.room_index:
+                self.reservations.setdefault((row["lr"], row["day"]), []).append((row["start_time"], row["end_time"]))
+        for day in sorted({day for _, day in self.reservations} | {key[1] for key in self.roster.sections}):
+            self._day(day)
+        for (lr, day), intervals in self.reservations.items():
+            self._rebuild(lr, day)
+
+        # student timetables from the roster index: section keys carry day and times
+        students = {}
+        for (course, day, start_time, end_time), mails in self.roster.sections.items():
+            bits = self.grid.mask(start_time, end_time)
+            day_index = self.days[day]
+            for mail in mails:
+                students.setdefault(mail, {}).setdefault(day_index, 0)
+                students[mail][day_index] |= bits
+        self.student_index = {mail: i for i, mail in enumerate(students)}
+        self.student_bits = np.zeros((len(students), len(self.days)), dtype=np.uint64)
+        for mail, days in students.items():
+            row = self.student_index[mail]
+            for day_index, bits in days.items():
+                self.student_bits[row, day_index] = bits
+        self.day_versions = {known: version for known, version in seen.items() if isinstance(version, int)}
+        self.loaded_at = time.monotonic()
+
+    def _rebuild(self, lr, day):
+        bits = 0
+        for start_time, end_time in self.reservations.get((lr, day), []):
+            bits |= self.grid.mask(start_time, end_time)
+        # indexes first: a new room or day swaps in a resized room_bits
+        row, column = self._room(lr), self._day(day)
+        self.room_bits[row, column] = bits
+
+    # kept in step with this worker's bookings so results don't wait for the
+    # next reload. version is the day version the booking bumped to
+    def reserve(self, lr, day, start_time, end_time, version=None):
+        if self.loaded_at is None:
+            return
+        self.reservations.setdefault((lr, day), []).append((start_time, end_time))
+        self._rebuild(lr, day)
+        self._applied(day, version)
+
+    def release(self, lr, day, start_time, end_time, version=None):
+        if self.loaded_at is None:
+            return
+        intervals = self.reservations.get((lr, day), [])
+        # stored times may be spelled "08:00:00"
+        match = next((interval for interval in intervals if (to_minutes(interval[0]), to_minutes(interval[1])) == (to_minutes(start_time), to_minutes(end_time))), None)
+        if match is None:
+            # not what these bitsets hold, the next query reloads
+            return
+        intervals.remove(match)
+        self._rebuild(lr, day)
+        self._applied(day, version)
+
+    def _applied(self, day, version):
+        # only the version right after the one the bitsets reflect keeps them
+        # current, a gap means another worker booked in between
+        if isinstance(version, int) and self.day_versions.get(day) == version - 1:
+            self.day_versions[day] = version
+
+    def section_mails(self, course_name, day, start_time, end_time):
+        mails = self.roster.sections.get((course_name, day, start_time, end_time))
+        if mails is not None:
+            return mails
+        # times compare like postgres time columns, "08:00" is "08:00:00"
+        start, end = to_minutes(start_time), to_minutes(end_time)
+        for (course, section_day, section_start, section_end), mails in self.roster.sections.items():
+            if course == course_name and section_day == day and to_minutes(section_start) == start and to_minutes(section_end) == end:
+                return mails
+        return ()
+
+    def free_slots(self, target_day, course_name, course_day, course_start_time, course_end_time):
+        # callers validate the times, this only guards against a zero range step
+        duration = to_minutes(course_end_time) - to_minutes(course_start_time)
+        if duration <= 0:
+            return []
+        windows = self.grid.windows(duration)
+        if not self.rooms or not windows:
+            return []
+        window_bits = np.array([self.grid.mask(start, end) for start, end in windows], dtype=np.uint64)
+        day_index = self.days.get(target_day)
+
+        # rooms x windows: a window is free when it shares no bit with the room's day
+        if day_index is None:
+            room_free = np.ones((len(self.rooms), len(windows)), dtype=bool)
+        else:
+            room_free = (self.room_bits[:, day_index][:, None] & window_bits[None, :]) == 0
+
+        # students x windows: conflicts of the section's students on the target day
+        mails = self.section_mails(course_name, course_day, course_start_time, course_end_time)
+        rows = [self.student_index[mail] for mail in mails if mail in self.student_index]
+        total = len(mails)
+        if rows and day_index is not None:
+            student_days = self.student_bits[rows, day_index]
+            conflicts = ((student_days[:, None] & window_bits[None, :]) != 0).sum(axis=0)
+        else:
+            conflicts = np.zeros(len(windows), dtype=np.int64)
+        available = total - conflicts
+        share = available / total if total else np.ones(len(windows))
+        green = share >= GREEN_SHARE
+
+        result = []
+        for room, free in zip(self.rooms, room_free):
+            slots = [{
+                "start_time": windows[w][0],
+                "end_time": windows[w][1],
+                "available_students": int(available[w]),
+                "total_students": total,
+                "status": "GREEN" if green[w] else "RED",
+            } for w in np.flatnonzero(free)]
+            if slots:
+                result.append({room: slots})
+        return result
@@ -0,0 +1,72 @@
+# /get-free-slots: per room get_free_slot_status rpc fan-out vs the local
+# numpy bitmap engine, against the in-memory postgrest stand-in
+#   python benchmarks/bench_free_slots.py --rooms 40 --students 2000 --db-latency 20
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from standins import InMemoryPostgrest
+from loadtest import configure_environment
+
+
+async def timed_calls(client, bodies):
+    latencies, responses = [], []
+    for body in bodies:
+        started = time.perf_counter()
+        res = await client.post("/get-free-slots", json=body)
+        latencies.append(time.perf_counter() - started)
+        responses.append(res.json())
+    return latencies, responses
+
+
+async def main_async(args):
+    configure_environment(0, 4)
+    import main
+
+    standin = InMemoryPostgrest(latency=args.db_latency / 1000)
+    sections = standin.seed(teachers=args.teachers, rooms=args.rooms, students=args.students)
+    main.repo.transport = httpx.ASGITransport(app=standin.app)
+    bodies = [{
+        "target_day": day,
+        "course_name": s["course_name"],
+        "course_day": s["day"],
+        "course_start_time": s["start_time"],
+        "course_end_time": s["end_time"],
+    } for s in sections[:args.queries] for day in ("Monday", "Saturday")]
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=120) as client:
+        main.FREE_SLOTS_ENGINE = "rpc"
+        rpc_latencies, rpc_responses = await timed_calls(client, bodies)
+        main.FREE_SLOTS_ENGINE = "local"
+        started = time.perf_counter()
+        await main.get_availability()
+        load = time.perf_counter() - started
+        local_latencies, local_responses = await timed_calls(client, bodies)
+
+    mismatches = sum(1 for a, b in zip(rpc_responses, local_responses) if a != b)
+    print(f"rooms {args.rooms}, students {args.students}, queries {len(bodies)}, simulated db latency {args.db_latency} ms")
+    for label, values in (("rpc fan-out", rpc_latencies), ("local engine", local_latencies)):
+        print(f"  {label:13s} p50 {statistics.median(values) * 1000:9.2f} ms   max {max(values) * 1000:9.2f} ms")
+    print(f"  engine load (one off) {load * 1000:.1f} ms")
+    print(f"  responses identical: {len(bodies) - mismatches}/{len(bodies)}")
+    await main.repo.close()
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="rpc vs local free slot engine")
+    parser.add_argument("--teachers", type=int, default=20)
+    parser.add_argument("--rooms", type=int, default=40)
+    parser.add_argument("--students", type=int, default=600)
+    parser.add_argument("--queries", type=int, default=10, help="sections to query (each on two days)")
+    parser.add_argument("--db-latency", type=float, default=5.0, help="simulated postgrest round trip in ms")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(main_async(args)) else 0)
@@ -0,0 +1,66 @@
+# compares per recipient cost of the old inline notification loop against the
+# render once templates in notifications.py
+#   python benchmarks/bench_notifications.py [recipients] [rounds]
+import os
+import sys
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notifications import makeup_scheduled, MAKEUP_SCHEDULED_HTML, MAKEUP_SCHEDULED_TEXT
+from string import Template
+
+FIELDS = {
+    "course_name": "Object Oriented Programming",
+    "day": "Wednesday",
+    "start_time": "11:00",
+    "end_time": "14:00",
+    "lr": "36",
+}
+SENDER = "scheduling@example.edu"
+
+
+def inline(mails):
+    # mirrors the old loop: full body + mime tree + serialisation per student
+    html = Template(MAKEUP_SCHEDULED_HTML)
+    text = Template(MAKEUP_SCHEDULED_TEXT)
+    out = []
+    for mail in mails:
+        fields = dict(FIELDS, year=time.localtime().tm_year)
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = "Makeup Class Alert"
+        msg["From"] = SENDER
+        msg["To"] = mail
+        msg.attach(MIMEText(text.substitute(fields), "plain"))
+        msg.attach(MIMEText(html.substitute(fields), "html"))
+        out.append(msg.as_bytes(policy=msg.policy.clone(linesep="\r\n")))
+    return out
+
+
+def render_once(mails):
+    notification = makeup_scheduled.render(SENDER, **FIELDS)
+    return [notification.for_recipient(mail) for mail in mails]
+
+
+def bench(fn, mails, rounds):
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn(mails)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    recipients = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    mails = [f"student{i}@example.edu" for i in range(recipients)]
+    old = bench(inline, mails, rounds)
+    new = bench(render_once, mails, rounds)
+    print(f"recipients: {recipients}, best of {rounds}")
+    print(f"inline       total {old * 1000:8.3f} ms  per recipient {old / recipients * 1e6:8.1f} us")
+    print(f"render once  total {new * 1000:8.3f} ms  per recipient {new / recipients * 1e6:8.1f} us")
+    print(f"speedup      {old / new:.1f}x")
@@ -0,0 +1,59 @@
+# cold start benchmark: fresh interpreter -> import main -> first GET / response
+#   python benchmarks/bench_startup.py [runs]
+import os
+import sys
+import json
+import time
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# main refuses to import without a signing secret
+ENV = {"SESSION_SECRET": "bench-secret", **os.environ}
+
+# runs inside the fresh interpreter, drives the asgi app directly so no
+# server or http client import is counted
+CHILD = r"""
+import time
+started = time.perf_counter()
+import asyncio, json
+import main
+imported = time.perf_counter()
+
+async def first_request():
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/", "raw_path": b"/", "root_path": "", "query_string": b"",
+             "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80)}
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    await main.app(scope, receive, send)
+    return sent[0]["status"]
+
+status = asyncio.run(first_request())
+done = time.perf_counter()
+print(json.dumps({"status": status, "import_ms": (imported - started) * 1000, "first_response_ms": (done - started) * 1000}))
+"""
+
+
+def run_once():
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=ENV, capture_output=True, text=True)
+    wall = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = wall
+    return result
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = [run_once() for _ in range(runs)]
+    print(f"cold starts: {runs}")
+    for field, label in [("import_ms", "import main"), ("first_response_ms", "import -> first GET /"), ("process_ms", "process start -> exit")]:
+        values = [r[field] for r in results]
+        print(f"  {label:24s} median {statistics.median(values):8.1f} ms  min {min(values):8.1f} ms  max {max(values):8.1f} ms")
@@ -0,0 +1,41 @@
+# import-time profile of main.py, summarised from python -X importtime
+#   python benchmarks/import_profile.py [top]
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# main refuses to import without a signing secret
+ENV = {"SESSION_SECRET": "bench-secret", **os.environ}
+
+
+def profile():
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=ENV, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    return rows
+
+
+if __name__ == "__main__":
+    top = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    rows = profile()
+    total = next(cumulative for cumulative, _, _, name in rows if name == "main")
+    print(f"import main: {total / 1000:.1f} ms")
+    # modules imported directly by main (or the interpreter) are what we control
+    print(f"\ntop {top} direct imports by cumulative time")
+    for cumulative, _, depth, name in sorted((r for r in rows if r[2] <= 1 and r[3] != "main"), reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    print(f"\ntop {top} modules by self time")
+    for _, self_us, _, name in sorted(((r[1], r[1], r[2], r[3]) for r in rows), reverse=True)[:top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
@@ -0,0 +1,310 @@
+# offline load test: drives every route in main.py against the local
+# stand-ins (in-memory postgrest, smtp sink, fake llm) and reports latency
+# percentiles and throughput per endpoint
+#   python benchmarks/loadtest.py --concurrency 20 --requests 200
+#   python benchmarks/loadtest.py --json out.json --baseline previous.json
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from standins import InMemoryPostgrest, SmtpSink, FakeLLM
+
+BENCH_PIN = "1234"
+
+
+def environment(smtp_port, rounds):
+    # settings pointing main at the stand-ins
+    return {
+        "POSTGREST_URL": "http://standin/rest/v1",
+        "SUPABASE_KEY": "bench",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_MAIL": "scheduling@uni.example",
+        "SMTP_PASSWORD": "",
+        "SMTP_STARTTLS": "false",
+        "SMTP_RATE": "0",
+        "BCRYPT_ROUNDS": str(rounds),
+        "SESSION_SECRET": "bench-secret",
+    }
+
+def configure_environment(smtp_port, rounds):
+    # must happen before main (and the modules it imports) read their settings
+    os.environ.update(environment(smtp_port, rounds))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Scenario:
+    # build(i) -> (method, url, kwargs) for one http request, or call(client, i)
+    # -> status code for anything that isn't a single request. prepare(client,
+    # requests) runs untimed before the scenario
+    def __init__(self, name, build=None, call=None, prepare=None):
+        self.name = name
+        self.build = build
+        self.call = call
+        self.prepare = prepare
+
+
+async def websocket_subscribe(app, path):
+    # one in-process websocket session over raw asgi (httpx has no websockets):
+    # connect, wait for the "subscribed" message, disconnect
+    inbox, outbox = asyncio.Queue(), asyncio.Queue()
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench")], "server": ("bench", 80), "client": ("127.0.0.1", 0), "subprotocols": [],
+    }
+    await inbox.put({"type": "websocket.connect"})
+    task = asyncio.create_task(app(scope, inbox.get, outbox.put))
+    try:
+        accepted = await outbox.get()
+        if accepted["type"] != "websocket.accept":
+            return 403
+        first = await outbox.get()
+        if first["type"] != "websocket.send" or json.loads(first["text"])["type"] != "subscribed":
+            return 500
+        return 101
+    finally:
+        await inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await task
+
+
+def revalidating(name, build):
+    # every request carries the etag fetched for its url beforehand, so the
+    # timed part is the If-None-Match / 304 path
+    etags = {}
+
+    def key(kwargs):
+        return json.dumps([kwargs.get("params"), kwargs.get("headers")], sort_keys=True)
+
+    async def prepare(client, requests):
+        for i in range(requests):
+            method, url, kwargs = build(i)
+            if url + key(kwargs) not in etags:
+                etags[url + key(kwargs)] = (await client.request(method, url, **kwargs)).headers.get("etag", "")
+
+    async def call(client, i):
+        method, url, kwargs = build(i)
+        headers = {**kwargs.get("headers", {}), "If-None-Match": etags[url + key(kwargs)]}
+        return (await client.request(method, url, **{**kwargs, "headers": headers})).status_code
+
+    return Scenario(name, call=call, prepare=prepare)
+
+
+def scenarios(app, sections, tokens, free_slots_info, chat_session, closable_sessions):
+    from auth import issue_token
+
+    def section(i):
+        return sections[i % len(sections)]
+
+    def auth(p_id):
+        return {"Authorization": f"Bearer {tokens[p_id]}"}
+
+    def makeup(i, lr, day="Saturday", start="08:00", end="11:00"):
+        s = section(i)
+        return {
+            "p_id": s["p_id"],
+            "booked_start_time": start,
+            "booked_end_time": end,
+            "booked_lr": lr,
+            "booked_day": day,
+            "course_name": s["course_name"],
+            "course_start_time": s["start_time"],
+            "course_end_time": s["end_time"],
+            "course_day": s["day"],
+        }
+
+    def free_slots(i):
+        s = section(i)
+        return {
+            "target_day": "Saturday",
+            "course_name": s["course_name"],
+            "course_day": s["day"],
+            "course_start_time": s["start_time"],
+            "course_end_time": s["end_time"],
+        }
+
+    def get_courses(i):
+        return ("GET", "/get-courses", {"params": {"p_id": section(i)["p_id"]}, "headers": auth(section(i)["p_id"])})
+
+    def get_free_slots(i):
+        return ("GET", "/get-free-slots", {"params": free_slots(i)})
+
+    def get_makeups(i):
+        return ("GET", "/get-makeups", {"params": {"p_id": section(i)["p_id"]}, "headers": auth(section(i)["p_id"])})
+
+    def logout(i):
+        # a fresh token each time, logging out revokes it
+        return ("POST", "/logout", {"headers": {"Authorization": f"Bearer {issue_token(section(i)['p_id'])[0]}"}})
+
+    def batch(i):
+        items = [makeup(i, f"B{i}-{k}", day=["Saturday", "Sunday"][k % 2]) for k in range(4)]
+        p_id = items[0]["p_id"]
+        for item in items:
+            item["p_id"] = p_id
+        return items
+
+    return [
+        Scenario("GET /", lambda i: ("GET", "/", {})),
+        Scenario("POST /login", lambda i: ("POST", "/login", {"json": {"registered_name": "x", "p_id": section(i)["p_id"], "pin": BENCH_PIN}})),
+        Scenario("POST /account-create", lambda i: ("POST", "/account-create", {"json": {"p_id": f"N{i:06d}", "registered_name": "New", "pin": BENCH_PIN}})),
+        Scenario("POST /get-courses", lambda i: ("POST", "/get-courses", {"json": {"p_id": section(i)["p_id"]}, "headers": auth(section(i)["p_id"])})),
+        Scenario("POST /logout", logout),
+        Scenario("GET /get-courses", get_courses),
+        revalidating("GET /get-courses (If-None-Match)", get_courses),
+        Scenario("POST /get-free-slots", lambda i: ("POST", "/get-free-slots", {"json": free_slots(i)})),
+        Scenario("GET /get-free-slots", get_free_slots),
+        revalidating("GET /get-free-slots (If-None-Match)", get_free_slots),
+        Scenario("WS /ws/free-slots/{target_day}", call=lambda client, i: websocket_subscribe(app, f"/ws/free-slots/{['Saturday', 'Sunday'][i % 2]}")),
+        Scenario("POST /book-makeup", lambda i: ("POST", "/book-makeup", {"json": makeup(i, f"M{i}"), "headers": auth(section(i)["p_id"])})),
+        Scenario("POST /get-makeups", lambda i: ("POST", "/get-makeups", {"json": {"p_id": section(i)["p_id"]}, "headers": auth(section(i)["p_id"])})),
+        Scenario("GET /get-makeups", get_makeups),
+        revalidating("GET /get-makeups (If-None-Match)", get_makeups),
+        Scenario("POST /remove-booked-makeup", lambda i: ("POST", "/remove-booked-makeup", {"json": makeup(i, f"M{i}"), "headers": auth(section(i)["p_id"])})),
+        Scenario("POST /book-makeups", lambda i: ("POST", "/book-makeups", {"json": batch(i), "headers": auth(batch(i)[0]["p_id"])})),
+        Scenario("POST /generate-response", lambda i: ("POST", "/generate-response", {"json": {"message": f"which slots are free? ({i})", "history": [], "free_slots_info": free_slots_info}})),
+        Scenario("POST /generate-response/stream", lambda i: ("POST", "/generate-response/stream", {"json": {"message": f"recommend a time ({i})", "history": [], "free_slots_info": free_slots_info}})),
+        Scenario("POST /chat-sessions", lambda i: ("POST", "/chat-sessions", {"json": {"free_slots_info": free_slots_info}})),
+        Scenario("POST /chat-sessions/{id}/messages", lambda i: ("POST", f"/chat-sessions/{chat_session}/messages", {"json": {"message": f"is room {i} free later? ({i})"}})),
+        Scenario("POST /chat-sessions/{id}/messages/stream", lambda i: ("POST", f"/chat-sessions/{chat_session}/messages/stream", {"json": {"message": f"what about room {i}? ({i})"}})),
+        Scenario("GET /chat-sessions/{id}", lambda i: ("GET", f"/chat-sessions/{chat_session}", {})),
+        Scenario("DELETE /chat-sessions/{id}", lambda i: ("DELETE", f"/chat-sessions/{closable_sessions[i % len(closable_sessions)]}", {})),
+        Scenario("GET /stats", lambda i: ("GET", "/stats", {})),
+        Scenario("GET /metrics", lambda i: ("GET", "/metrics", {})),
+    ]
+
+
+async def run_scenario(client, scenario, requests, concurrency):
+    if scenario.prepare is not None:
+        await scenario.prepare(client, requests)
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            if scenario.call is not None:
+                status = await scenario.call(client, i)
+            else:
+                method, url, kwargs = scenario.build(i)
+                status = (await client.request(method, url, **kwargs)).status_code
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+async def main_async(args):
+    sink = SmtpSink()
+    configure_environment(sink.start(), args.bcrypt_rounds)
+
+    import main
+    from hashing import hash_password
+    from auth import issue_token
+
+    standin = InMemoryPostgrest(latency=args.db_latency / 1000)
+    sections = standin.seed(teachers=args.teachers, rooms=args.rooms, students=args.students, pin_hash=hash_password(BENCH_PIN))
+    main.repo.transport = httpx.ASGITransport(app=standin.app)
+    main.client = FakeLLM(first_token=args.llm_first_token / 1000, per_token=args.llm_per_token / 1000)
+    tokens = {s["p_id"]: issue_token(s["p_id"])[0] for s in sections}
+
+    selected = set(args.only.split(",")) if args.only else None
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=60) as client:
+        sample = await client.post("/get-free-slots", json={
+            "target_day": "Saturday",
+            "course_name": sections[0]["course_name"],
+            "course_day": sections[0]["day"],
+            "course_start_time": sections[0]["start_time"],
+            "course_end_time": sections[0]["end_time"],
+        })
+        chat_session = (await client.post("/chat-sessions", json={"free_slots_info": sample.json()})).json()["session_id"]
+        closable_sessions = [(await client.post("/chat-sessions", json={"free_slots_info": sample.json()})).json()["session_id"] for _ in range(args.requests)]
+        for scenario in scenarios(main.app, sections, tokens, sample.json(), chat_session, closable_sessions):
+            if selected and scenario.name not in selected and scenario.name.split(" ", 1)[1] not in selected:
+                continue
+            results[scenario.name] = await run_scenario(client, scenario, args.requests, args.concurrency)
+            print_row(scenario.name, results[scenario.name])
+
+    main.get_email_dispatcher().join()
+    sink.stop()
+    print(f"\nsmtp sink: {sink.messages} messages over {sink.connections} connections, postgrest stand-in: {standin.requests} requests, 304s: {main.versions.not_modified}")
+    await main.repo.close()
+    return results
+
+
+def print_header():
+    print(f"{'endpoint':44s} {'reqs':>6s} {'errs':>5s} {'req/s':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+
+def print_row(name, r):
+    print(f"{name:44s} {r['requests']:6d} {r['errors']:5d} {r['rps']:9.1f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f}")
+
+
+def compare(results, baseline_path, tolerance):
+    # flags endpoints whose p95 got more than `tolerance` slower than the baseline
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before and before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="offline load test for main.py")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--only", help="comma separated endpoints, e.g. /login,/get-free-slots")
+    parser.add_argument("--teachers", type=int, default=20)
+    parser.add_argument("--rooms", type=int, default=40)
+    parser.add_argument("--students", type=int, default=600)
+    parser.add_argument("--db-latency", type=float, default=2.0, help="simulated postgrest round trip in ms")
+    parser.add_argument("--llm-first-token", type=float, default=300.0, help="fake llm time to first token in ms")
+    parser.add_argument("--llm-per-token", type=float, default=10.0, help="fake llm time per token in ms")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare p95 against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown vs baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    print_header()
+    results = asyncio.run(main_async(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
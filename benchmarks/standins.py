@@ -0,0 +1,304 @@
+# local stand-ins for the services main.py talks to, so the benchmarks can run
+# offline: an in-memory postgrest for the five tables and the rpc functions,
+# an smtp sink and a fake streaming llm
+import asyncio
+import random
+import threading
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+TABLES = ["credentials", "teachers_assigned_courses", "lr_reserved", "makeup_classes", "students_assigned_courses"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+CLASS_TIMES = [("08:00", "11:00"), ("11:00", "14:00"), ("14:00", "17:00"), ("17:00", "20:00")]
+DAY_START = 8 * 60
+DAY_END = 20 * 60
+
+
+def to_minutes(value):
+    hours, minutes = str(value).split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+def as_time(value):
+    # what postgres' ::time makes of "08:00" and "08:00:00", seconds since midnight
+    hours, minutes, *seconds = str(value).split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + (int(seconds[0]) if seconds else 0)
+
+def same_times(row, item, columns):
+    return all(as_time(row[column]) == as_time(item[column]) for column in columns)
+
+def to_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def overlaps(start, end, other_start, other_end):
+    return to_minutes(start) < to_minutes(other_end) and to_minutes(other_start) < to_minutes(end)
+
+
+class InMemoryPostgrest:
+    def __init__(self, latency=0.0):
+        self.tables = {name: [] for name in TABLES}
+        self.latency = latency
+        self.requests = 0
+        self.app = FastAPI()
+        self.app.add_api_route("/rest/v1/rpc/{name}", self.handle_rpc, methods=["POST"])
+        self.app.add_api_route("/rest/v1/{table}", self.handle_table, methods=["GET", "POST", "PATCH", "DELETE"])
+
+    # postgrest style table access
+    def _matches(self, row, filters):
+        return all(str(row.get(column)) == value for column, value in filters.items())
+
+    def _project(self, rows, select):
+        if not select or select == "*":
+            return [dict(row) for row in rows]
+        columns = select.split(",")
+        return [{column: row.get(column) for column in columns} for row in rows]
+
+    async def handle_table(self, table: str, request: Request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if table not in self.tables:
+            return JSONResponse(status_code=404, content={"message": f"relation {table} does not exist"})
+        rows = self.tables[table]
+        params = dict(request.query_params)
+        select = params.pop("select", "*")
+        order = params.pop("order", None)
+        limit = params.pop("limit", None)
+        offset = int(params.pop("offset", 0))
+        filters = {column: value[3:] for column, value in params.items() if value.startswith("eq.")}
+
+        if request.method == "GET":
+            found = [row for row in rows if self._matches(row, filters)]
+            if order:
+                columns = order.split(",")
+                found.sort(key=lambda row: [str(row.get(column)) for column in columns])
+            found = found[offset:offset + int(limit) if limit is not None else None]
+            return self._project(found, select)
+        if request.method == "POST":
+            body = await request.json()
+            new_rows = body if isinstance(body, list) else [body]
+            if table == "credentials":
+                existing = {row["p_id"] for row in rows}
+                if any(row["p_id"] in existing for row in new_rows):
+                    return JSONResponse(status_code=409, content={"message": "duplicate key value violates unique constraint"})
+            rows.extend(dict(row) for row in new_rows)
+            return JSONResponse(status_code=201, content=new_rows)
+        if request.method == "PATCH":
+            values = await request.json()
+            changed = []
+            for row in rows:
+                if self._matches(row, filters):
+                    row.update(values)
+                    changed.append(dict(row))
+            return changed
+        removed = [row for row in rows if self._matches(row, filters)]
+        self.tables[table] = [row for row in rows if not self._matches(row, filters)]
+        return removed
+
+    # rpc functions, mirroring sql/booking.sql and the supabase get_free_slot_status
+    async def handle_rpc(self, name: str, request: Request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        args = await request.json()
+        handler = getattr(self, f"rpc_{name}", None)
+        if handler is None:
+            return JSONResponse(status_code=404, content={"message": f"function {name} does not exist"})
+        return handler(**args)
+
+    def _section_mails(self, course_name, day, start_time, end_time):
+        return [row["s_mail"] for row in self.tables["students_assigned_courses"]
+                if row["course_assigned"] == course_name and row["day"] == day
+                and same_times(row, {"start_time": start_time, "end_time": end_time}, ("start_time", "end_time"))]
+
+    def _room_clash(self, lr, day, start_time, end_time):
+        for row in self.tables["lr_reserved"]:
+            if row["lr"] == lr and row["day"] == day and overlaps(start_time, end_time, row["start_time"], row["end_time"]):
+                return {key: row[key] for key in ("lr", "day", "start_time", "end_time", "course_name")}
+        return None
+
+    def rpc_get_free_slot_status(self, lr_input, target_day, course_name, course_day, course_start, course_end):
+        duration = to_minutes(course_end) - to_minutes(course_start)
+        students = set(self._section_mails(course_name, course_day, course_start, course_end))
+        busy = [row for row in self.tables["students_assigned_courses"] if row["s_mail"] in students and row["day"] == target_day]
+        slots = []
+        for start in range(DAY_START, DAY_END - duration + 1, duration):
+            start_time, end_time = to_time(start), to_time(start + duration)
+            if self._room_clash(lr_input, target_day, start_time, end_time):
+                continue
+            clashing = {row["s_mail"] for row in busy if overlaps(start_time, end_time, row["start_time"], row["end_time"])}
+            available = len(students) - len(clashing)
+            share = available / len(students) if students else 1.0
+            slots.append({
+                "start_time": start_time,
+                "end_time": end_time,
+                "available_students": available,
+                "total_students": len(students),
+                "status": "GREEN" if share >= 0.5 else "RED",
+            })
+        return slots
+
+    def _book(self, item):
+        clash = self._room_clash(item["lr"], item["day"], item["start_time"], item["end_time"])
+        if clash:
+            return {"status": "conflict", "conflict": clash}
+        self.tables["makeup_classes"].append(dict(item))
+        self.tables["lr_reserved"].append({key: item[key] for key in ("lr", "course_name", "day", "start_time", "end_time")})
+        return {"status": "ok", "students": self._section_mails(item["course_name"], item["course_day"], item["course_start_time"], item["course_end_time"])}
+
+    def rpc_book_makeup_tx(self, **item):
+        return self._book(item)
+
+    def rpc_book_makeups_tx(self, items):
+        results = []
+        for index, item in enumerate(items):
+            result = self._book(item)
+            result["index"] = index
+            results.append(result)
+        return {"results": results}
+
+    def rpc_cancel_makeup_tx(self, **item):
+        # text columns compare as is, time columns as ::time, like sql/booking.sql
+        times = ("start_time", "end_time", "course_start_time", "course_end_time")
+        texts = [key for key in item if key not in times]
+        makeups = self.tables["makeup_classes"]
+        keep = [row for row in makeups if any(row.get(key) != item[key] for key in texts) or not same_times(row, item, times)]
+        if len(keep) == len(makeups):
+            return {"status": "not_found"}
+        self.tables["makeup_classes"] = keep
+        self.tables["lr_reserved"] = [row for row in self.tables["lr_reserved"]
+                                      if any(row[key] != item[key] for key in ("lr", "course_name", "day")) or not same_times(row, item, ("start_time", "end_time"))]
+        return {"status": "ok", "students": self._section_mails(item["course_name"], item["course_day"], item["course_start_time"], item["course_end_time"])}
+
+    # synthetic data
+    def seed(self, teachers=20, rooms=40, students=600, sections_per_teacher=4, sections_per_student=5, pin_hash="", seed=7):
+        rng = random.Random(seed)
+        room_names = [str(room) for room in range(1, rooms + 1)]
+        sections = []
+        for teacher in range(teachers):
+            p_id = f"T{teacher:03d}"
+            self.tables["credentials"].append({"p_id": p_id, "registered_name": f"Teacher {teacher}", "pin": pin_hash})
+            for number in range(sections_per_teacher):
+                day = rng.choice(DAYS)
+                start_time, end_time = rng.choice(CLASS_TIMES)
+                section = {
+                    "p_id": p_id,
+                    "course_name": f"Course {teacher}-{number}",
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "lr": rng.choice(room_names),
+                    "day": day,
+                }
+                sections.append(section)
+                self.tables["teachers_assigned_courses"].append(section)
+                self.tables["lr_reserved"].append({key: section[key] for key in ("lr", "course_name", "day", "start_time", "end_time")})
+        for student in range(students):
+            mail = f"student{student}@uni.example"
+            for section in rng.sample(sections, min(sections_per_student, len(sections))):
+                self.tables["students_assigned_courses"].append({
+                    "s_mail": mail,
+                    "course_assigned": section["course_name"],
+                    "day": section["day"],
+                    "start_time": section["start_time"],
+                    "end_time": section["end_time"],
+                })
+        return sections
+
+
+class SmtpSink:
+    # accepts plain (no tls) smtp and just counts what it receives
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.messages = 0
+        self.recipients = 0
+        self.connections = 0
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="smtp-sink", daemon=True).start()
+        self._ready.wait()
+        return self.port
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(self._loop.create_server(lambda: _SinkProtocol(self), self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+
+class _SinkProtocol(asyncio.Protocol):
+    def __init__(self, sink):
+        self.sink = sink
+        self.buffer = b""
+        self.in_data = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.sink.connections += 1
+        transport.write(b"220 sink ESMTP\r\n")
+
+    def data_received(self, data):
+        self.buffer += data
+        while b"\r\n" in self.buffer:
+            line, self.buffer = self.buffer.split(b"\r\n", 1)
+            self.handle(line)
+
+    def handle(self, line):
+        if self.in_data:
+            if line == b".":
+                self.in_data = False
+                self.sink.messages += 1
+                self.transport.write(b"250 OK queued\r\n")
+            return
+        command = line[:4].upper()
+        if command == b"EHLO":
+            self.transport.write(b"250-sink\r\n250 8BITMIME\r\n")
+        elif command == b"RCPT":
+            self.sink.recipients += 1
+            self.transport.write(b"250 OK\r\n")
+        elif command in (b"HELO", b"MAIL", b"RSET", b"NOOP"):
+            self.transport.write(b"250 OK\r\n")
+        elif command == b"DATA":
+            self.in_data = True
+            self.transport.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+        elif command == b"QUIT":
+            self.transport.write(b"221 Bye\r\n")
+            self.transport.close()
+        else:
+            self.transport.write(b"502 Command not implemented\r\n")
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    # stands in for ChatNVIDIA: fixed latency to first token, then a steady token rate
+    def __init__(self, first_token=0.3, per_token=0.01, tokens=40):
+        self.first_token = first_token
+        self.per_token = per_token
+        self.tokens = tokens
+        self.calls = 0
+
+    def _words(self):
+        return [f"word{i} " for i in range(self.tokens)]
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.first_token + self.per_token * self.tokens)
+        return FakeMessage("".join(self._words()))
+
+    async def astream(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.first_token)
+        for word in self._words():
+            yield FakeMessage(word)
+            await asyncio.sleep(self.per_token)
@@ -0,0 +1,154 @@
+# in-process ttl/lru read-through cache with an optional shared backend so
+# several workers see the same invalidations
+import os
+import json
+import time
+import asyncio
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger("cache")
+
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "300"))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+
+MISSING = object()
+
+
+def _size(value):
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+class RedisBackend:
+    # shared store + pub/sub channel for invalidations, needs the redis package.
+    # the calls block, TTLCache runs them on a worker thread
+    channel = "makeup-cache-invalidate"
+
+    def __init__(self, url, ttl):
+        import redis
+        self.ttl = ttl
+        self.redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.redis.get(key)
+        return MISSING if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        self.redis.set(key, json.dumps(value, default=str), ex=int(self.ttl) or None)
+
+    def delete(self, key):
+        self.redis.delete(key)
+        self.redis.publish(self.channel, key)
+
+    def subscribe(self, callback):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: lambda message: callback(message["data"].decode())})
+        pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+
+class TTLCache:
+    def __init__(self, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, backend=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        if backend is not None:
+            backend.subscribe(self._drop)
+
+    async def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, size, value = entry
+                if expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+        if self.backend is not None:
+            try:
+                value = await asyncio.to_thread(self.backend.get, key)
+            except Exception as e:
+                logger.warning("shared cache get failed: %s", e)
+                value = MISSING
+            if value is not MISSING:
+                self._store(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return MISSING
+
+    async def set(self, key, value):
+        self._store(key, value)
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.set, key, value)
+            except Exception as e:
+                logger.warning("shared cache set failed: %s", e)
+
+    async def invalidate(self, key):
+        with self._lock:
+            self.invalidations += 1
+        self._drop(key)
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.delete, key)
+            except Exception as e:
+                logger.warning("shared cache invalidate failed: %s", e)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "shared": self.backend is not None,
+        }
+
+    def _store(self, key, value):
+        size = _size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.bytes += size
+            # evict least recently used entries until we fit again
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _drop(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+
+def create_cache():
+    backend = None
+    if CACHE_REDIS_URL:
+        try:
+            backend = RedisBackend(CACHE_REDIS_URL, CACHE_TTL)
+        except Exception as e:
+            logger.warning("shared cache disabled: %s", e)
+    return TTLCache(backend=backend)
@@ -0,0 +1,215 @@
+# server side chat sessions for the scheduling assistant: the history and the
+# compact slot context live here, so clients only send the new message and
+# the prompt stays inside a fixed token budget however long the chat runs
+import os
+import json
+import time
+import secrets
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from assistant import estimate_tokens
+
+logger = logging.getLogger("conversations")
+
+CHAT_HISTORY_TOKENS = int(os.environ.get("CHAT_HISTORY_TOKENS", "1200"))
+CHAT_SUMMARY_TOKENS = int(os.environ.get("CHAT_SUMMARY_TOKENS", "200"))
+CHAT_SESSION_TTL = float(os.environ.get("CHAT_SESSION_TTL", "3600"))
+CHAT_MAX_SESSIONS = int(os.environ.get("CHAT_MAX_SESSIONS", "1000"))
+CHAT_SESSION_DB = os.environ.get("CHAT_SESSION_DB")
+
+
+def _turn_tokens(turn):
+    return estimate_tokens(turn["content"]) + 4
+
+
+class Conversation:
+    def __init__(self, id, free_slots, history=None, summary="", stats=None):
+        self.id = id
+        self.free_slots = free_slots
+        self.history = history or []
+        # questions from turns that no longer fit in the window
+        self.summary = summary
+        self.stats = stats or {
+            "messages": 0,
+            "payload_bytes": 0,
+            "last_payload_bytes": 0,
+            "prompt_tokens": 0,
+            "last_prompt_tokens": 0,
+            "trimmed_turns": 0,
+        }
+        self.touched = time.monotonic()
+
+    def context(self):
+        # what goes between the system prompt and the new message
+        if not self.summary:
+            return list(self.history)
+        return [{"role": "system", "content": f"Earlier in this conversation the teacher asked: {self.summary}"}] + self.history
+
+    def record_request(self, payload_bytes, prompt_tokens):
+        self.stats["messages"] += 1
+        self.stats["payload_bytes"] += payload_bytes
+        self.stats["last_payload_bytes"] = payload_bytes
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["last_prompt_tokens"] = prompt_tokens
+
+    def add_turn(self, message, answer):
+        self.history.append({"role": "user", "content": message})
+        self.history.append({"role": "assistant", "content": answer})
+        self.trim()
+
+    def trim(self, budget=CHAT_HISTORY_TOKENS, summary_budget=CHAT_SUMMARY_TOKENS):
+        # oldest turns leave the window first, user questions are folded into
+        # the summary so the model still knows they came up
+        while len(self.history) > 2 and sum(_turn_tokens(turn) for turn in self.history) > budget:
+            dropped = self.history.pop(0)
+            self.stats["trimmed_turns"] += 1
+            if dropped["role"] == "user":
+                question = " ".join(dropped["content"].split())
+                self.summary = f"{self.summary}; {question}" if self.summary else question
+        # the summary keeps its most recent end
+        limit = summary_budget * 4
+        if len(self.summary) > limit:
+            self.summary = "..." + self.summary[-limit:]
+
+    def describe(self):
+        return {
+            **self.stats,
+            "history_turns": len(self.history),
+            "history_tokens": sum(_turn_tokens(turn) for turn in self.history),
+            "summary_tokens": estimate_tokens(self.summary),
+            "slot_tokens": estimate_tokens(self.free_slots),
+        }
+
+    def dump(self):
+        return json.dumps({"free_slots": self.free_slots, "history": self.history, "summary": self.summary, "stats": self.stats})
+
+    @classmethod
+    def load(cls, id, raw):
+        data = json.loads(raw)
+        return cls(id, data["free_slots"], data["history"], data["summary"], data["stats"])
+
+
+class SqliteBackend:
+    # keeps conversations across restarts of a single instance
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("create table if not exists conversations (id text primary key, data text not null, updated real not null)")
+        self.db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, id, ttl):
+        with self._lock:
+            row = self.db.execute("select data, updated from conversations where id = ?", (id,)).fetchone()
+        if row is None or row[1] + ttl < time.time():
+            return None
+        return row[0]
+
+    def set(self, id, data):
+        with self._lock:
+            self.db.execute("insert or replace into conversations (id, data, updated) values (?, ?, ?)", (id, data, time.time()))
+            self.db.commit()
+
+    def delete(self, id):
+        with self._lock:
+            self.db.execute("delete from conversations where id = ?", (id,))
+            self.db.commit()
+
+
+class ConversationStore:
+    def __init__(self, ttl=CHAT_SESSION_TTL, max_sessions=CHAT_MAX_SESSIONS, backend=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.backend = backend
+        self.sessions = OrderedDict()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def create(self, free_slots, history=None):
+        conversation = Conversation(secrets.token_urlsafe(16), free_slots)
+        for turn in history if isinstance(history, list) else []:
+            if isinstance(turn, dict) and turn.get("role") in ("user", "assistant") and isinstance(turn.get("content"), str):
+                conversation.history.append({"role": turn["role"], "content": turn["content"]})
+        conversation.trim()
+        with self._lock:
+            self.created += 1
+        self.save(conversation)
+        return conversation
+
+    def get(self, id):
+        with self._lock:
+            conversation = self.sessions.get(id)
+            if conversation is not None:
+                if time.monotonic() - conversation.touched < self.ttl:
+                    conversation.touched = time.monotonic()
+                    self.sessions.move_to_end(id)
+                    return conversation
+                del self.sessions[id]
+                self.expired += 1
+        if self.backend is not None:
+            try:
+                raw = self.backend.get(id, self.ttl)
+            except Exception as e:
+                logger.warning("conversation load failed: %s", e)
+                raw = None
+            if raw is not None:
+                conversation = Conversation.load(id, raw)
+                self._keep(conversation)
+                return conversation
+        return None
+
+    def save(self, conversation):
+        conversation.touched = time.monotonic()
+        self._keep(conversation)
+        if self.backend is not None:
+            try:
+                self.backend.set(conversation.id, conversation.dump())
+            except Exception as e:
+                logger.warning("conversation save failed: %s", e)
+
+    def delete(self, id):
+        with self._lock:
+            self.sessions.pop(id, None)
+        if self.backend is not None:
+            try:
+                self.backend.delete(id)
+            except Exception as e:
+                logger.warning("conversation delete failed: %s", e)
+
+    def _keep(self, conversation):
+        with self._lock:
+            self.sessions[conversation.id] = conversation
+            self.sessions.move_to_end(conversation.id)
+            # least recently used conversations leave memory first (they are
+            # still in the backend when there is one)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            conversations = list(self.sessions.values())
+        messages = sum(c.stats["messages"] for c in conversations)
+        return {
+            "sessions": len(conversations),
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "persistent": self.backend is not None,
+            "history_budget_tokens": CHAT_HISTORY_TOKENS,
+            "avg_payload_bytes": sum(c.stats["payload_bytes"] for c in conversations) / messages if messages else 0.0,
+            "avg_prompt_tokens": sum(c.stats["prompt_tokens"] for c in conversations) / messages if messages else 0.0,
+        }
+
+
+def create_conversation_store():
+    backend = None
+    if CHAT_SESSION_DB:
+        try:
+            backend = SqliteBackend(CHAT_SESSION_DB)
+        except Exception as e:
+            logger.warning("conversation persistence disabled: %s", e)
+    return ConversationStore(backend=backend)
@@ -0,0 +1,164 @@
+# async data access for the supabase tables, talking to postgrest directly
+# over one pooled keep-alive http client
+import os
+import httpx
+from metrics import timed
+
+
+class RepositoryError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class DuplicateRecord(RepositoryError):
+    pass
+
+
+def eq(**filters):
+    return {column: f"eq.{value}" for column, value in filters.items()}
+
+
+class Repository:
+    def __init__(self, base_url, api_key, max_connections=20, max_keepalive=10, timeout=10.0, transport=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.timeout = timeout
+        # an httpx transport (e.g. ASGITransport) to serve requests in-process
+        self.transport = transport
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            headers = {}
+            if self.api_key:
+                headers = {"apikey": self.api_key, "Authorization": f"Bearer {self.api_key}"}
+            self._client = httpx.AsyncClient(base_url=self.base_url, headers=headers, limits=self.limits, timeout=self.timeout, transport=self.transport)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method, path, params=None, json=None, prefer=None):
+        headers = {"Prefer": prefer} if prefer else None
+        with timed("supabase", f"{method} {path}"):
+            res = await self.client.request(method, path, params=params, json=json, headers=headers)
+        if res.status_code == 409:
+            raise DuplicateRecord(res.status_code, res.text)
+        if res.status_code >= 400:
+            raise RepositoryError(res.status_code, res.text)
+        if not res.content:
+            return []
+        return res.json()
+
+    async def select(self, table, columns="*", **filters):
+        params = eq(**filters)
+        params["select"] = columns
+        return await self._request("GET", f"/{table}", params=params)
+
+    async def insert(self, table, rows):
+        return await self._request("POST", f"/{table}", json=rows, prefer="return=representation")
+
+    async def update(self, table, values, **filters):
+        return await self._request("PATCH", f"/{table}", params=eq(**filters), json=values, prefer="return=representation")
+
+    async def delete(self, table, **filters):
+        return await self._request("DELETE", f"/{table}", params=eq(**filters), prefer="return=representation")
+
+    async def rpc(self, name, args):
+        return await self._request("POST", f"/rpc/{name}", json=args)
+
+    # credentials
+    async def get_pin(self, p_id):
+        return await self.select("credentials", "pin", p_id=p_id)
+
+    async def update_pin(self, p_id, pin):
+        return await self.update("credentials", {"pin": pin}, p_id=p_id)
+
+    async def create_credentials(self, row):
+        return await self.insert("credentials", row)
+
+    # teachers_assigned_courses
+    async def get_courses(self, p_id):
+        return await self.select("teachers_assigned_courses", "course_name,start_time,end_time,lr,day", p_id=p_id)
+
+    async def get_all_courses(self):
+        return await self.select("teachers_assigned_courses", "lr,day,start_time,end_time")
+
+    # lr_reserved
+    async def get_reserved_rooms(self):
+        return await self.select("lr_reserved", "lr")
+
+    async def get_reservations(self):
+        return await self.select("lr_reserved", "lr,course_name,day,start_time,end_time")
+
+    async def get_free_slot_status(self, lr, target_day, course_name, course_day, course_start, course_end):
+        return await self.rpc("get_free_slot_status", {
+            "lr_input": lr,
+            "target_day": target_day,
+            "course_name": course_name,
+            "course_day": course_day,
+            "course_start": course_start,
+            "course_end": course_end,
+        })
+
+    # makeup_classes
+    async def get_makeups(self, p_id):
+        return await self.select("makeup_classes", "*", p_id=p_id)
+
+    # booking writes go through the transactional functions in sql/booking.sql
+    async def book_makeup(self, p_id, lr, day, start_time, end_time, course_name, course_day, course_start_time, course_end_time):
+        return await self.rpc("book_makeup_tx", {
+            "p_id": p_id,
+            "lr": lr,
+            "day": day,
+            "start_time": start_time,
+            "end_time": end_time,
+            "course_name": course_name,
+            "course_day": course_day,
+            "course_start_time": course_start_time,
+            "course_end_time": course_end_time,
+        })
+
+    async def book_makeups(self, items):
+        return await self.rpc("book_makeups_tx", {"items": items})
+
+    async def cancel_makeup(self, p_id, lr, day, start_time, end_time, course_name, course_day, course_start_time, course_end_time):
+        return await self.rpc("cancel_makeup_tx", {
+            "p_id": p_id,
+            "lr": lr,
+            "day": day,
+            "start_time": start_time,
+            "end_time": end_time,
+            "course_name": course_name,
+            "course_day": course_day,
+            "course_start_time": course_start_time,
+            "course_end_time": course_end_time,
+        })
+
+
+    # students_assigned_courses
+    async def get_enrollments(self, offset, limit):
+        params = {
+            "select": "s_mail,course_assigned,day,start_time,end_time",
+            "order": "course_assigned,day,start_time,end_time,s_mail",
+            "offset": offset,
+            "limit": limit,
+        }
+        return await self._request("GET", "/students_assigned_courses", params=params)
+
+
+def create_repository():
+    # POSTGREST_URL points at a local postgrest compatible stand-in for testing
+    base_url = os.environ.get("POSTGREST_URL") or f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/rest/v1"
+    return Repository(
+        base_url,
+        os.environ.get("SUPABASE_KEY"),
+        max_connections=int(os.environ.get("DB_MAX_CONNECTIONS", "20")),
+        max_keepalive=int(os.environ.get("DB_MAX_KEEPALIVE", "10")),
+    )
@@ -0,0 +1,121 @@
+# bcrypt runs in its own fixed size process pool so peak logins can't starve
+# the shared request threadpool
+import os
+import time
+import asyncio
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from passlib.context import CryptContext
+from metrics import timed
+
+logger = logging.getLogger("hashing")
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", "2"))
+BCRYPT_QUEUE_LIMIT = int(os.environ.get("BCRYPT_QUEUE_LIMIT", "16"))
+
+# hashes below the configured rounds are flagged so they get upgraded on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+# these run inside the pool workers
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def verify_password(plain_password: str, hashed_password: str):
+    # returns (valid, replacement hash or None)
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, workers=BCRYPT_WORKERS, queue_limit=BCRYPT_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                try:
+                    # the pool starts after the anyio, smtp and redis threads,
+                    # a plain fork could hand a worker a lock held by one of them
+                    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+                except (OSError, NotImplementedError) as e:
+                    # some serverless sandboxes have no working semaphores
+                    logger.warning("process pool unavailable, hashing on threads: %s", e)
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return self._pool
+
+    def _replace(self, pool):
+        # a worker that died takes the whole pool down, the next call gets a new one
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+        logger.warning("bcrypt pool broke, starting a new one")
+
+    async def _run(self, fn, *args):
+        pool = self._executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            self._replace(pool)
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+
+    async def _submit(self, fn, *args):
+        # admission control: fail fast instead of queueing without bound
+        with self._lock:
+            if self.in_flight >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise HasherBusy()
+            self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            with timed("bcrypt", fn.__name__):
+                return await self._run(fn, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def hash(self, password):
+        return await self._submit(hash_password, password)
+
+    async def verify(self, plain_password, hashed_password):
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    def stats(self):
+        busy = min(self.in_flight, self.workers)
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "rounds": BCRYPT_ROUNDS,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - self.workers, 0),
+            "utilisation": busy / self.workers if self.workers else 0.0,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "avg_latency_ms": self.total_seconds / self.completed * 1000 if self.completed else 0.0,
+            "max_latency_ms": self.max_seconds * 1000,
+        }
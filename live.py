@@ -0,0 +1,140 @@
+# live lr_reserved changes per target day, pushed to websocket subscribers
+# instead of clients re-polling /get-free-slots. with CACHE_REDIS_URL set the
+# events go through redis pub/sub so subscribers on every worker see them
+import os
+import json
+import asyncio
+import logging
+
+logger = logging.getLogger("live")
+
+LIVE_QUEUE_SIZE = 32
+LIVE_HEARTBEAT = float(os.environ.get("LIVE_HEARTBEAT", "15"))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+
+
+class RedisRelay:
+    # needs the redis package; publishing blocks so it runs on a worker
+    # thread, and the listener thread hands messages back to the event loop
+    channel = "makeup-live"
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.listening = False
+
+    def publish(self, message):
+        self.redis.publish(self.channel, message)
+
+    def listen(self, loop, deliver):
+        if self.listening:
+            return
+        self.listening = True
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: lambda message: loop.call_soon_threadsafe(deliver, message["data"].decode())})
+        pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+
+class SlotHub:
+    def __init__(self, queue_size=LIVE_QUEUE_SIZE, relay=None, heartbeat=LIVE_HEARTBEAT, version_of=None):
+        self.queue_size = queue_size
+        self.relay = relay
+        # async version_of(day) -> the day's data version sent with heartbeats
+        self.heartbeat = heartbeat
+        self.version_of = version_of
+        self.subscribers = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.heartbeats = 0
+        self._beat = None
+
+    def subscribe(self, day):
+        loop = asyncio.get_running_loop()
+        if self.relay is not None:
+            self.relay.listen(loop, self.deliver)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(day, set()).add(queue)
+        if self.version_of is not None and self.heartbeat and (self._beat is None or self._beat.done() or self._beat.get_loop() is not loop):
+            self._beat = loop.create_task(self._heartbeats())
+        return queue
+
+    def unsubscribe(self, day, queue):
+        queues = self.subscribers.get(day)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[day]
+
+    async def publish(self, event):
+        # serialised once no matter how many clients watch this day
+        message = json.dumps(event, separators=(",", ":"))
+        self.published += 1
+        if self.relay is not None:
+            try:
+                # every worker, this one included, delivers it from the channel
+                await asyncio.to_thread(self.relay.publish, message)
+                return
+            except Exception as e:
+                logger.warning("live relay publish failed, delivering locally: %s", e)
+        self.deliver(message)
+
+    def deliver(self, message):
+        self._fan_out(json.loads(message)["day"], message)
+
+    async def _heartbeats(self):
+        # one version read per watched day per tick, however many sockets
+        # watch it, and only while anyone is subscribed
+        while self.subscribers:
+            await asyncio.sleep(self.heartbeat)
+            for day in list(self.subscribers):
+                try:
+                    version = await self.version_of(day)
+                except Exception as e:
+                    logger.warning("heartbeat version read failed: %s", e)
+                    continue
+                self.heartbeats += 1
+                self._fan_out(day, json.dumps({"type": "heartbeat", "day": day, "version": version}, separators=(",", ":")))
+
+    def _fan_out(self, day, message):
+        queues = self.subscribers.get(day)
+        if not queues:
+            return
+        # idle subscribers are just a parked coroutine and a queue
+        for queue in list(queues):
+            try:
+                queue.put_nowait(message)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # a client this far behind gets disconnected and should refetch
+                self.dropped += 1
+                queues.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def reserved(self, lr, day, start_time, end_time, course_name, version):
+        await self.publish({"type": "reserved", "lr": lr, "day": day, "start_time": start_time, "end_time": end_time, "course_name": course_name, "version": version})
+
+    async def released(self, lr, day, start_time, end_time, course_name, version):
+        await self.publish({"type": "released", "lr": lr, "day": day, "start_time": start_time, "end_time": end_time, "course_name": course_name, "version": version})
+
+    def stats(self):
+        return {
+            "days": len(self.subscribers),
+            "subscribers": sum(len(queues) for queues in self.subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "heartbeats": self.heartbeats,
+            "shared": self.relay is not None,
+        }
+
+
+def create_slot_hub(version_of=None):
+    relay = None
+    if CACHE_REDIS_URL:
+        try:
+            relay = RedisRelay(CACHE_REDIS_URL)
+        except Exception as e:
+            logger.warning("live relay disabled, events stay on this worker: %s", e)
+    return SlotHub(relay=relay, version_of=version_of)
@@ -0,0 +1,163 @@
+# background email dispatcher used for the booking notifications
+import smtplib
+import threading
+import queue
+import time
+import logging
+from metrics import timed
+
+logger = logging.getLogger("mailer")
+
+# errors worth retrying, anything else is dropped after logging
+TEMPORARY_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError, OSError)
+
+
+class EmailDispatcher:
+    def __init__(self, host, port, user=None, password=None, starttls=True,
+                 rate_per_second=5.0, max_retries=3, backoff=1.0, idle_timeout=60.0):
+        self.host = host
+        self.port = int(port) if port else 587
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.min_interval = 1.0 / rate_per_second if rate_per_second else 0.0
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.queue = queue.Queue()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.pending_retries = 0
+        self._server = None
+        self._last_used = 0.0
+        self._last_send = 0.0
+        self._worker = None
+        self._lock = threading.Lock()
+
+    # public api
+    def enqueue(self, to_addr, message):
+        self._ensure_worker()
+        self.queue.put((to_addr, message, 0))
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "pending_retries": self.pending_retries,
+            "connected": self._server is not None,
+        }
+
+    def join(self, timeout=None):
+        # waits for queued mails and any retries still sleeping in a timer,
+        # returns how many were still outstanding when the timeout ran out
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks or self.pending_retries:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+        return self.queue.unfinished_tasks + self.pending_retries
+
+    # connection handling
+    def _connect(self):
+        with timed("smtp", "connect"):
+            server = smtplib.SMTP(self.host, self.port, timeout=30)
+            if self.starttls:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        return server
+
+    def _connection(self):
+        # reuse the authenticated connection unless it sat idle for too long
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self._close()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def _close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def _send(self, to_addr, message):
+        server = self._connection()
+        with timed("smtp", "send"):
+            if isinstance(message, (bytes, str)):
+                server.sendmail(self.user, [to_addr], message)
+            else:
+                server.send_message(message, self.user, [to_addr])
+        self._last_used = time.monotonic()
+
+    # worker loop
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="email-dispatcher", daemon=True)
+                self._worker.start()
+
+    def _throttle(self):
+        wait = self._last_send + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_send = time.monotonic()
+
+    def _run(self):
+        while True:
+            try:
+                to_addr, message, attempt = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._close()
+                continue
+            try:
+                self._throttle()
+                self._send(to_addr, message)
+                self.sent += 1
+            except smtplib.SMTPResponseException as e:
+                # 4xx replies are temporary, 5xx are permanent
+                self._close()
+                if 400 <= e.smtp_code < 500:
+                    self._retry(to_addr, message, attempt, e)
+                else:
+                    self.failed += 1
+                    logger.error("dropping mail to %s: %s", to_addr, e)
+            except smtplib.SMTPRecipientsRefused as e:
+                self.failed += 1
+                logger.error("recipient refused %s: %s", to_addr, e)
+            except TEMPORARY_ERRORS as e:
+                self._close()
+                self._retry(to_addr, message, attempt, e)
+            except Exception as e:
+                self._close()
+                self.failed += 1
+                logger.exception("unexpected error sending mail to %s: %s", to_addr, e)
+            finally:
+                self.queue.task_done()
+
+    def _retry(self, to_addr, message, attempt, error):
+        if attempt >= self.max_retries:
+            self.failed += 1
+            logger.error("giving up on mail to %s after %d retries: %s", to_addr, attempt, error)
+            return
+        self.retried += 1
+        with self._lock:
+            self.pending_retries += 1
+        delay = self.backoff * (2 ** attempt)
+        logger.warning("retrying mail to %s in %.1fs: %s", to_addr, delay, error)
+        timer = threading.Timer(delay, self._requeue, args=(to_addr, message, attempt + 1))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, to_addr, message, attempt):
+        self.queue.put((to_addr, message, attempt))
+        with self._lock:
+            self.pending_retries -= 1
@@ -1,36 +1,82 @@
 # libraries to import
 import os
-from supabase import create_client,Client
-from fastapi import FastAPI,Request
+from fastapi import FastAPI,Request,Response,Depends,WebSocket,WebSocketDisconnect
+from fastapi.responses import JSONResponse,StreamingResponse,PlainTextResponse
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from passlib.context import CryptContext
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
+from typing import List
+import asyncio
+import time
+import json
+import logging
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
+# before the local modules below read their settings
 load_dotenv()
 
-
-
-SMTP_HOST = "smtp.gmail.com"
-SMTP_PORT = os.environ.get("SMTP_PORT")
-SMTP_USER = os.environ.get("SMTP_MAIL")
-SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
-
-client = ChatNVIDIA(
-  model="meta/llama-3.3-70b-instruct",
-  api_key=os.environ.get("LLAMA_KEY"), 
-  temperature=0.2,
-  top_p=0.7,
-  max_tokens=1024,
-)
+from mailer import EmailDispatcher
+from hashing import PasswordHasher,HasherBusy
+from auth import issue_token,session_claims,require_owner,revocations
+from db import create_repository,DuplicateRecord
+from cache import create_cache,MISSING
+from assistant import build_messages,encode_free_slots,estimate_tokens,AnswerCache,CompletionStats
+from conversations import create_conversation_store
+from notifications import makeup_scheduled,makeup_cancelled,makeup_digest
+from live import create_slot_hub
+from versions import create_versions
+from singleflight import SingleFlight
+from metrics import registry,request_latency,dependency_latency,timed,start_trace,log_trace
+
+# max number of get_free_slot_status rpc calls in flight at once
+FREE_SLOTS_CONCURRENCY = int(os.environ.get("FREE_SLOTS_CONCURRENCY", "8"))
+
+# "rpc" asks supabase per room, "local" uses the in-process bitmap engine
+FREE_SLOTS_ENGINE = os.environ.get("FREE_SLOTS_ENGINE", "rpc")
+
+# max number of makeups in one /book-makeups call
+BOOK_MAKEUPS_LIMIT = int(os.environ.get("BOOK_MAKEUPS_LIMIT", "10"))
+
+# how long shutdown waits for queued notifications to go out
+SMTP_DRAIN_TIMEOUT = float(os.environ.get("SMTP_DRAIN_TIMEOUT", "10"))
+
+logger = logging.getLogger("main")
+
+# the llm client, smtp dispatcher and their settings are created on first use
+# so cold starts for routes that never touch them don't pay for the imports
+client = None
+
+def get_client():
+    global client
+    if client is None:
+        from langchain_nvidia_ai_endpoints import ChatNVIDIA
+        client = ChatNVIDIA(
+          model="meta/llama-3.3-70b-instruct",
+          api_key=os.environ.get("LLAMA_KEY"), 
+          temperature=0.2,
+          top_p=0.7,
+          max_tokens=1024,
+        )
+    return client
+
+completion_stats = CompletionStats()
+answer_cache = AnswerCache()
+
+# server side chat histories, see /chat-sessions
+conversations = create_conversation_store()
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await repo.close()
+    # the dispatcher thread is a daemon, anything still queued dies with the process
+    if email_dispatcher is not None:
+        remaining = await asyncio.to_thread(email_dispatcher.join, SMTP_DRAIN_TIMEOUT)
+        if remaining:
+            logger.warning("shutting down with %d notifications unsent", remaining)
 
 # initializing app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,23 +86,105 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# initializing passlib
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto"
-)
-
-# useful functions
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-# supabase variable initialization
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
-supabase : Client =  create_client(url,key)
+# per route latency histogram + sampled traces of the dependency calls
+@app.middleware("http")
+async def record_request(request:Request, call_next):
+    spans = start_trace()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        route = route.path if route is not None else "unmatched"
+        request_latency.observe((request.method, route, str(status)), elapsed)
+        if spans is not None:
+            log_trace(request.method, route, status, elapsed, spans)
+
+# notifications are queued and sent in the background over one smtp connection
+email_dispatcher = None
+
+def get_email_dispatcher():
+    global email_dispatcher
+    if email_dispatcher is None:
+        email_dispatcher = EmailDispatcher(
+            os.environ.get("SMTP_HOST", "smtp.gmail.com"),
+            os.environ.get("SMTP_PORT"),
+            os.environ.get("SMTP_MAIL"),
+            os.environ.get("SMTP_PASSWORD"),
+            starttls=os.environ.get("SMTP_STARTTLS", "true").lower() != "false",
+            rate_per_second=float(os.environ.get("SMTP_RATE", "5")),
+        )
+    return email_dispatcher
+
+# bcrypt hashing pool (size, queue limit and rounds come from the environment)
+hasher = PasswordHasher()
+
+@app.exception_handler(HasherBusy)
+async def hasher_busy(request:Request, exc:HasherBusy):
+    return JSONResponse(status_code=503, content={"busy":"Server is busy, please try again shortly."}, headers={"Retry-After":"1"})
+
+# supabase (postgrest) repository over a pooled async http client
+repo = create_repository()
+
+# read-through cache for the per teacher course and makeup lists
+cache = create_cache()
+
+# in-process free slot engine with its own section -> student mails index,
+# only built (and numpy imported) when enabled. notifications don't need the
+# index, the booking rpcs return the section's students
+availability = None
+
+async def get_availability(day=None, version=None):
+    global availability
+    if availability is None:
+        from availability import AvailabilityEngine
+        from roster import RosterIndex
+        availability = AvailabilityEngine(repo, RosterIndex(repo), versions=versions)
+    # a day version the engine hasn't seen (a booking on another worker) reloads it
+    await availability.ensure_loaded(day, version)
+    return availability
+
+# per teacher / per day versions behind the etags of the GET read endpoints,
+# shared between workers through redis when CACHE_REDIS_URL is set
+versions = create_versions()
+
+# websocket subscribers per target day, see /ws/free-slots/{target_day}
+slot_hub = create_slot_hub(versions.day)
+
+def not_modified(request, etag, cache_control):
+    # answered before any query runs
+    if versions.matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag":etag,"Cache-Control":cache_control})
+    return None
+
+# every lr_reserved change goes to the local engine and the live subscribers
+async def room_reserved(lr, day, start_time, end_time, course_name):
+    version = await versions.bump_day(day)
+    if availability is not None:
+        availability.reserve(lr,day,start_time,end_time,version)
+    await slot_hub.reserved(lr,day,start_time,end_time,course_name,version)
+
+async def room_released(lr, day, start_time, end_time, course_name):
+    version = await versions.bump_day(day)
+    if availability is not None:
+        availability.release(lr,day,start_time,end_time,version)
+    await slot_hub.released(lr,day,start_time,end_time,course_name,version)
+
+# identical concurrent /get-free-slots queries share one fan-out
+free_slot_flights = SingleFlight()
+
+# caps the get_free_slot_status rpc calls in flight at once
+free_slots_limit = asyncio.Semaphore(FREE_SLOTS_CONCURRENCY)
+
+async def fetch_free_slot_status(lr, req):
+    async with free_slots_limit:
+        started = time.perf_counter()
+        data = await repo.get_free_slot_status(lr,req.target_day,req.course_name,req.course_day,req.course_start_time,req.course_end_time)
+        return data, time.perf_counter() - started
 
 # models
 class LoginRequest(BaseModel):
@@ -105,414 +233,551 @@ class RemoveBookMakeupRequest(BaseModel):
 
 # endpoints
 @app.post("/login")
-def login(req:LoginRequest):
-    res = supabase.table("credentials").select("pin").eq("p_id",req.p_id).execute()
-    if res.data:
-        hashed_password = res.data[0]['pin']
-        check = verify_password(req.pin,hashed_password)
+async def login(req:LoginRequest):
+    res = await repo.get_pin(req.p_id)
+    if res:
+        hashed_password = res[0]['pin']
+        check, new_hash = await hasher.verify(req.pin,hashed_password)
         if(check):
-            return {"success":"user authenticated successfully."}
+            # upgrade hashes made with old rounds / deprecated schemes
+            if new_hash:
+                await repo.update_pin(req.p_id,new_hash)
+            token, expires_in = issue_token(req.p_id)
+            return {"success":"user authenticated successfully.","token":token,"expires_in":expires_in}
         return {"Unauthorized":"User is unauthorized"}
     return "Error Signing In to your account."
 
+@app.post("/logout")
+async def logout(everywhere:bool = False, claims:dict = Depends(session_claims)):
+    # ?everywhere=true signs the teacher out of every device
+    if everywhere:
+        await revocations.revoke_user(claims["sub"])
+    else:
+        await revocations.revoke_token(claims["jti"],claims["exp"])
+    return {"success":"Logged out successfully."}
+
 @app.post("/account-create")
-def account_create(req:AccountCreationRequest):
-    hashed_pin = hash_password(req.pin)
+async def account_create(req:AccountCreationRequest):
+    hashed_pin = await hasher.hash(req.pin)
     structured_data = {
         "p_id":req.p_id,
         "registered_name":req.registered_name,
         "pin": hashed_pin
     }
     try:
-        res = supabase.table("credentials").insert(structured_data).execute()
-        if res.data:
+        res = await repo.create_credentials(structured_data)
+        if res:
             return "Account Created Successfully."
-    except:
+    except DuplicateRecord:
         return "This user already exists" 
     return "Error creating account."
 
-@app.post("/get-courses")
-def get_courses(req:GetCoursesRequest):
-    res = supabase.table("teachers_assigned_courses").select("course_name,start_time,end_time,lr,day").eq("p_id",req.p_id).execute()
-    if res.data:
-        return res.data
+async def load_courses(p_id):
+    res = await cache.get(f"courses:{p_id}")
+    if res is MISSING:
+        res = await repo.get_courses(p_id)
+        await cache.set(f"courses:{p_id}",res)
+    if res:
+        return res
     return "No Courses Found."
 
-@app.post("/get-free-slots")
-def get_free_slots(req:GetFreeSlots):
-    res = supabase.table("lr_reserved").select("lr").execute()
-    if res.data:
+@app.get("/get-courses")
+async def get_courses(p_id:str, request:Request, response:Response, claims:dict = Depends(session_claims)):
+    require_owner(claims,p_id)
+    etag = await versions.teacher_etag("courses",p_id)
+    cached = not_modified(request,etag,"private, no-cache")
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return await load_courses(p_id)
+
+# POST variants of the read endpoints stay for older clients
+@app.post("/get-courses")
+async def post_get_courses(req:GetCoursesRequest, claims:dict = Depends(session_claims)):
+    require_owner(claims,req.p_id)
+    return await load_courses(req.p_id)
+
+def normalise_time(value):
+    try:
+        minutes = to_minutes(value)
+    except ValueError:
+        return value
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def free_slots_key(req):
+    # "8:00" and " 08:00:00" ask the same question, so they share a computation.
+    # only the key is normalised, the computation gets the caller's values
+    return (
+        req.target_day.strip(),
+        req.course_name.strip(),
+        req.course_day.strip(),
+        normalise_time(req.course_start_time.strip()),
+        normalise_time(req.course_end_time.strip()),
+    )
+
+def invalid_course_times(req):
+    return valid_range(req.course_start_time,req.course_end_time) is None
+
+async def load_free_slots(req, response):
+    if invalid_course_times(req):
+        return JSONResponse(status_code=400, content={"error":"invalid","detail":"Course start time must be before its end time."})
+    # the day's version is part of the key, so nothing computed before a
+    # booking on that day is handed out after it
+    key = free_slots_key(req)
+    key = (await versions.day(key[0]),) + key
+    lrs, timing = await free_slot_flights.run(key, lambda: compute_free_slots(req, key[0]))
+    response.headers["Server-Timing"] = timing
+    return lrs
+
+async def compute_free_slots(req, version=None):
+    if FREE_SLOTS_ENGINE == "local":
+        started = time.perf_counter()
+        engine = await get_availability(req.target_day.strip(), version)
+        lrs = engine.free_slots(req.target_day,req.course_name,req.course_day,req.course_start_time,req.course_end_time)
+        timing = f"engine;dur={(time.perf_counter() - started) * 1000:.1f}"
+        if engine.rooms:
+            return lrs, timing
+        return "Error extracting free slots", timing
+    res = await repo.get_reserved_rooms()
+    if res:
         lrs = []
-        data = set([lr['lr'] for lr in res.data])
-        for lr in data:
-            res = supabase.rpc("get_free_slot_status",{"lr_input":lr,"target_day":req.target_day,"course_name":req.course_name,"course_day":req.course_day,"course_start":req.course_start_time,"course_end":req.course_end_time}).execute()
-            if res.data:
-                structured_data = {lr:res.data}
+        timings = []
+        # rooms are queried concurrently but always returned in sorted order
+        data = sorted(set([lr['lr'] for lr in res]), key=str)
+        results = await asyncio.gather(*[fetch_free_slot_status(lr, req) for lr in data])
+        for lr, (slots, elapsed) in zip(data, results):
+            timings.append(f'lr-{lr};dur={elapsed * 1000:.1f}')
+            if slots:
+                structured_data = {lr:slots}
                 lrs.append(structured_data)
-        return lrs
-    return "Error extracting free slots"
+        # per room rpc timings for the client / devtools
+        return lrs, ", ".join(timings)
+    return "Error extracting free slots", ""
+
+@app.get("/get-free-slots")
+async def get_free_slots(request:Request, response:Response, req:GetFreeSlots = Depends()):
+    # only bookings on the target day change the answer
+    etag = await versions.day_etag("free-slots",req.target_day,*free_slots_key(req)[1:],FREE_SLOTS_ENGINE)
+    cached = not_modified(request,etag,"no-cache")
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return await load_free_slots(req, response)
+
+@app.post("/get-free-slots")
+async def post_get_free_slots(req:GetFreeSlots, response:Response):
+    return await load_free_slots(req, response)
+
+# pushes {"type":"reserved"|"released",lr,day,start_time,end_time,course_name,version}
+# whenever a room is booked or freed on this day. clients drop/restore the
+# matching windows locally instead of re-calling /get-free-slots. every
+# LIVE_HEARTBEAT seconds a {"type":"heartbeat",day,version} follows; a version
+# above the last one the client applied means it missed an event and should
+# refetch. a client that falls too far behind is closed with 1013
+@app.websocket("/ws/free-slots/{target_day}")
+async def free_slots_updates(websocket:WebSocket, target_day:str):
+    await websocket.accept()
+    queue = slot_hub.subscribe(target_day)
+
+    async def push():
+        # events and the hub's heartbeats arrive through the same queue
+        while True:
+            message = await queue.get()
+            if message is None:
+                await websocket.close(code=1013)
+                return
+            await websocket.send_text(message)
+
+    async def listen():
+        # only here to notice the client going away while nothing is published
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(push()), asyncio.create_task(listen())]
+    try:
+        await websocket.send_text(json.dumps({"type":"subscribed","day":target_day,"version":await versions.day(target_day)}))
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        slot_hub.unsubscribe(target_day,queue)
+        for task in tasks:
+            task.cancel()
+        # collects what they raised (a send on a closed socket) so nothing is
+        # left unretrieved
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def booking_error(status_code, error, detail, **extra):
+    return JSONResponse(status_code=status_code, content={"error":error,"detail":detail,**extra})
 
 @app.post("/remove-booked-makeup")
-def remove_booked_makeup(req:RemoveBookMakeupRequest):
-    res = supabase.table("makeup_classes").delete().eq("p_id",req.p_id).eq("lr",req.booked_lr).eq("start_time",req.booked_start_time).eq("end_time",req.booked_end_time).eq("day",req.booked_day).eq("course_name",req.course_name).eq("course_day",req.course_day).eq("course_start_time",req.course_start_time).eq("course_end_time",req.course_end_time).execute()
-    # return res
-    if res.data:
-        res = supabase.table("lr_reserved").delete().eq("lr",req.booked_lr).eq("course_name",req.course_name).eq("day",req.booked_day).eq("start_time",req.booked_start_time).eq("end_time",req.booked_end_time).execute()
-        if res.data:
-            students = supabase.table("students_assigned_courses").select("s_mail").eq("course_assigned",req.course_name).eq("day",req.course_day).eq("start_time",req.course_start_time).eq("end_time",req.course_end_time).execute()
-            if students.data:
-                mails = [mail['s_mail'] for mail in students.data]
-                for mail in mails:
-                    msg = MIMEMultipart("alternative")
-                    msg["Subject"] = "Makeup Class Cancelled - Action Required"
-                    msg["From"] = SMTP_USER
-                    msg["To"] = mail
-
-                    html_body = f"""
-                    <html>
-                        <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f4f7fa;">
-                            <div style="max-width: 650px; margin: 40px auto; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08);">
-                                
-                                <!-- Header -->
-                                <div style="background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%); padding: 40px 30px; text-align: center;">
-                                    <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 600; letter-spacing: -0.5px;">
-                                        ⚠️ Makeup Class Cancelled
-                                    </h1>
-                                    <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
-                                        Important Schedule Update
-                                    </p>
-                                </div>
-                                
-                                <!-- Main Content -->
-                                <div style="padding: 40px 30px;">
-                                    <p style="color: #2d3748; font-size: 16px; line-height: 1.6; margin: 0 0 20px 0;">
-                                        Dear <strong>Student</strong>,
-                                    </p>
-                                    
-                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 30px 0;">
-                                        We regret to inform you that the previously scheduled makeup class for <strong style="color: #ef4444;">{req.course_name}</strong> 
-                                        has been <strong>cancelled</strong>. Please see the cancelled class details below.
-                                    </p>
-                                    
-                                    <!-- Cancelled Class Details Card -->
-                                    <div style="background: linear-gradient(135deg, #fee2e2 0%, #fecaca 100%); border-left: 4px solid #ef4444; padding: 25px; border-radius: 12px; margin-bottom: 30px;">
-                                        <h3 style="color: #991b1b; margin: 0 0 20px 0; font-size: 18px; font-weight: 600;">
-                                            Cancelled Class Information
-                                        </h3>
-                                        
-                                        <div style="margin-bottom: 15px;">
-                                            <span style="color: #7f1d1d; font-size: 14px; display: inline-block; width: 120px;">📖 Course:</span>
-                                            <span style="color: #991b1b; font-size: 15px; font-weight: 600; text-decoration: line-through;">{req.course_name}</span>
-                                        </div>
-                                        
-                                        <div style="margin-bottom: 15px;">
-                                            <span style="color: #7f1d1d; font-size: 14px; display: inline-block; width: 120px;">📅 Date:</span>
-                                            <span style="color: #991b1b; font-size: 15px; font-weight: 600; text-decoration: line-through;">{req.booked_day}</span>
-                                        </div>
-                                        
-                                        <div style="margin-bottom: 15px;">
-                                            <span style="color: #7f1d1d; font-size: 14px; display: inline-block; width: 120px;">🕒 Time:</span>
-                                            <span style="color: #991b1b; font-size: 15px; font-weight: 600; text-decoration: line-through;">{req.booked_start_time} - {req.booked_end_time}</span>
-                                        </div>
-                                        
-                                        <div style="margin-bottom: 0;">
-                                            <span style="color: #7f1d1d; font-size: 14px; display: inline-block; width: 120px;">📍 Venue:</span>
-                                            <span style="color: #991b1b; font-size: 15px; font-weight: 600; text-decoration: line-through;">{req.booked_lr}</span>
-                                        </div>
-                                    </div>
-                                    
-                                    <!-- Important Notice -->
-                                    <div style="background-color: #fef3c7; border-left: 4px solid #f59e0b; padding: 20px; border-radius: 8px; margin-bottom: 30px;">
-                                        <p style="color: #92400e; margin: 0; font-size: 14px; line-height: 1.6;">
-                                            <strong>📢 Status:</strong> This makeup class has been officially cancelled. 
-                                            You do <strong>NOT</strong> need to attend. A new schedule will be communicated separately if rescheduled.
-                                        </p>
-                                    </div>
-                                    
-                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 10px 0;">
-                                        We apologize for any inconvenience this may cause. If you have any questions or concerns regarding this cancellation, 
-                                        please contact the academic office at your earliest convenience.
-                                    </p>
-                                    
-                                    <p style="color: #2d3748; font-size: 15px; margin: 20px 0 0 0;">
-                                        Best regards,<br>
-                                        <strong style="color: #ef4444;">Academic Scheduling Department</strong>
-                                    </p>
-                                </div>
-                                
-                                <!-- Footer -->
-                                <div style="background-color: #f7fafc; padding: 30px; text-align: center; border-top: 1px solid #e2e8f0;">
-                                    <p style="color: #718096; font-size: 13px; margin: 0 0 10px 0;">
-                                        This is an automated notification. Please do not reply to this email.
-                                    </p>
-                                    <p style="color: #a0aec0; font-size: 12px; margin: 0;">
-                                        © {datetime.now().year} University Academic Services. All rights reserved.
-                                    </p>
-                                </div>
-                                
-                            </div>
-                        </body>
-                    </html>
-                    """
-
-                    # Plain text version
-                    text_body = f"""
-                    MAKEUP CLASS CANCELLATION NOTICE
-                    ═══════════════════════════════════════
-
-                    Dear Student,
-
-                    We regret to inform you that the previously scheduled makeup class for {req.course_name} has been CANCELLED.
-
-                    CANCELLED CLASS DETAILS:
-                    ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-                    Course:     {req.course_name} [CANCELLED]
-                    Date:       {req.booked_day} [CANCELLED]
-                    Time:       {req.booked_start_time} - {req.booked_end_time} [CANCELLED]
-                    Venue:      {req.booked_lr} [CANCELLED]
-
-                    📢 STATUS: This makeup class has been officially cancelled.
-                    You do NOT need to attend.
-
-                    A new schedule will be communicated separately if the class is rescheduled.
-
-                    We apologize for any inconvenience this may cause. If you have any questions or concerns, 
-                    please contact the academic office immediately.
-
-                    Best regards,
-                    Academic Scheduling Department
-
-                    ---
-                    This is an automated notification.
-                    © {datetime.now().year} University Academic Services
-                    """
-
-                    # Attach both HTML and plain text versions
-                    part1 = MIMEText(text_body, "plain")
-                    part2 = MIMEText(html_body, "html")
-                    msg.attach(part1)
-                    msg.attach(part2)
-                    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-                        server.starttls()
-                        server.login(SMTP_USER, SMTP_PASSWORD)
-                        server.send_message(msg)
-
-                return {"success":"Booking Removed Successfully."} 
-    return "Error Removing the booking"
+async def remove_booked_makeup(req:RemoveBookMakeupRequest, claims:dict = Depends(session_claims)):
+    require_owner(claims,req.p_id)
+    detail = booking_times_error(req)
+    if detail is not None:
+        return booking_error(400,"invalid",detail)
+    # delete + release + roster lookup happen in one transaction (sql/booking.sql)
+    result = await repo.cancel_makeup(req.p_id,req.booked_lr,req.booked_day,req.booked_start_time,req.booked_end_time,req.course_name,req.course_day,req.course_start_time,req.course_end_time)
+    if result.get("status") == "not_found":
+        return booking_error(404,"not_found","No matching booking to remove.")
+    if result.get("status") != "ok":
+        return booking_error(500,"error","Error Removing the booking")
+    await cache.invalidate(f"makeups:{req.p_id}")
+    await versions.bump_teacher(req.p_id)
+    await room_released(req.booked_lr,req.booked_day,req.booked_start_time,req.booked_end_time,req.course_name)
+    mails = result.get("students", [])
+    if mails:
+        dispatcher = get_email_dispatcher()
+        notification = makeup_cancelled.render(
+            dispatcher.user,
+            course_name=req.course_name,
+            day=req.booked_day,
+            start_time=req.booked_start_time,
+            end_time=req.booked_end_time,
+            lr=req.booked_lr,
+        )
+        for address, message in notification.recipients(mails):
+            dispatcher.enqueue(address, message)
+    return {"success":"Booking Removed Successfully."}
 
 @app.post("/book-makeup")
-def book_makeup(req:BookMakeupRequest):
-    res = supabase.table('makeup_classes').insert({
-        "p_id":req.p_id,
-        "lr":req.booked_lr,
+async def book_makeup(req:BookMakeupRequest, claims:dict = Depends(session_claims)):
+    require_owner(claims,req.p_id)
+    detail = booking_times_error(req)
+    if detail is not None:
+        return booking_error(400,"invalid",detail)
+    # conflict check + both inserts + roster lookup in one round trip
+    result = await repo.book_makeup(req.p_id,req.booked_lr,req.booked_day,req.booked_start_time,req.booked_end_time,req.course_name,req.course_day,req.course_start_time,req.course_end_time)
+    if result.get("status") == "conflict":
+        return booking_error(409,"conflict","This room is already reserved for an overlapping slot.",conflict=result.get("conflict"))
+    if result.get("status") != "ok":
+        return booking_error(500,"error","Error booking and sending the data")
+    await cache.invalidate(f"makeups:{req.p_id}")
+    await versions.bump_teacher(req.p_id)
+    await room_reserved(req.booked_lr,req.booked_day,req.booked_start_time,req.booked_end_time,req.course_name)
+    mails = result.get("students", [])
+    if mails:
+        dispatcher = get_email_dispatcher()
+        notification = makeup_scheduled.render(
+            dispatcher.user,
+            course_name=req.course_name,
+            day=req.booked_day,
+            start_time=req.booked_start_time,
+            end_time=req.booked_end_time,
+            lr=req.booked_lr,
+        )
+        for address, message in notification.recipients(mails):
+            dispatcher.enqueue(address, message)
+    return {"success":"Booked Successfully."}
+
+def to_minutes(value):
+    hours, minutes = value.split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+def valid_range(start_time, end_time):
+    # (start, end) in minutes, None for unreadable times or an empty / reversed range
+    try:
+        start, end = to_minutes(start_time), to_minutes(end_time)
+    except ValueError:
+        return None
+    if not 0 <= start < end <= 24 * 60:
+        return None
+    return start, end
+
+def booking_times_error(req):
+    # checked before the rpc casts them to ::time, so bad input is a 400 not a 500
+    if valid_range(req.booked_start_time,req.booked_end_time) is None:
+        return "Start time must be before end time."
+    if valid_range(req.course_start_time,req.course_end_time) is None:
+        return "Course start time must be before its end time."
+    return None
+
+def notification_fields(req):
+    return {
+        "course_name":req.course_name,
+        "day":req.booked_day,
         "start_time":req.booked_start_time,
         "end_time":req.booked_end_time,
-        "day":req.booked_day,
-        "course_name":req.course_name,
-        "course_day":req.course_day,
-        "course_start_time":req.course_start_time,
-        "course_end_time":req.course_end_time
-    }).execute()
-    if res.data:
-        res = supabase.table("lr_reserved").insert({
-            "lr":req.booked_lr,
-            "course_name":req.course_name,
-            "day":req.booked_day,
-            "start_time":req.booked_start_time,
-            "end_time":req.booked_end_time
-        }).execute()
-        if res.data:
-            students = supabase.table("students_assigned_courses").select("s_mail").eq("course_assigned",req.course_name).eq("day",req.course_day).eq("start_time",req.course_start_time).eq("end_time",req.course_end_time).execute()
-            if students.data:
-                mails = [mail['s_mail'] for mail in students.data]
-                for mail in mails:
-                    msg = MIMEMultipart("alternative")
-                    msg["Subject"] = "Makeup Class Alert"
-                    msg["From"] = SMTP_USER
-                    msg["To"] = mail
-                    html_body = f"""
-                    <html>
-                        <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f4f7fa;">
-                            <div style="max-width: 650px; margin: 40px auto; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08);">
-                                
-                                <!-- Header -->
-                                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px 30px; text-align: center;">
-                                    <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 600; letter-spacing: -0.5px;">
-                                        📚 Makeup Class Scheduled
-                                    </h1>
-                                    <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
-                                        Important Academic Update
-                                    </p>
-                                </div>
-                                
-                                <!-- Main Content -->
-                                <div style="padding: 40px 30px;">
-                                    <p style="color: #2d3748; font-size: 16px; line-height: 1.6; margin: 0 0 20px 0;">
-                                        Dear <strong>Student</strong>,
-                                    </p>
-                                    
-                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 30px 0;">
-                                        We are writing to inform you about a scheduled makeup class for <strong style="color: #667eea;">{req.course_name}</strong>. 
-                                        Please review the details below and mark your calendar accordingly.
-                                    </p>
-                                    
-                                    <!-- Class Details Card -->
-                                    <div style="background: linear-gradient(135deg, #f6f8fb 0%, #e9ecef 100%); border-left: 4px solid #667eea; padding: 25px; border-radius: 12px; margin-bottom: 30px;">
-                                        <h3 style="color: #1a202c; margin: 0 0 20px 0; font-size: 18px; font-weight: 600;">
-                                            Class Information
-                                        </h3>
-                                        
-                                        <div style="margin-bottom: 15px;">
-                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">📖 Course:</span>
-                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">{req.course_name}</span>
-                                        </div>
-                                        
-                                        <div style="margin-bottom: 15px;">
-                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">📅 Date:</span>
-                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">{req.booked_day}</span>
-                                        </div>
-                                        
-                                        <div style="margin-bottom: 15px;">
-                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">🕒 Time:</span>
-                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">{req.booked_start_time} - {req.booked_end_time}</span>
-                                        </div>
-                                        
-                                        <div style="margin-bottom: 0;">
-                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">📍 Venue:</span>
-                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">{req.booked_lr}</span>
-                                        </div>
-                                    </div>
-                                    
-                                    <!-- Important Notice -->
-                                    <div style="background-color: #fff5e6; border-left: 4px solid #f59e0b; padding: 20px; border-radius: 8px; margin-bottom: 30px;">
-                                        <p style="color: #92400e; margin: 0; font-size: 14px; line-height: 1.6;">
-                                            <strong>⚠️ Attendance Mandatory:</strong> Your presence in this makeup class is essential. 
-                                            Please ensure you arrive on time and bring all necessary materials.
-                                        </p>
-                                    </div>
-                                    
-                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 10px 0;">
-                                        If you have any conflicts or questions regarding this schedule, please contact the academic office 
-                                        at your earliest convenience.
-                                    </p>
-                                    
-                                    <p style="color: #2d3748; font-size: 15px; margin: 20px 0 0 0;">
-                                        Best regards,<br>
-                                        <strong style="color: #667eea;">Academic Scheduling Department</strong>
-                                    </p>
-                                </div>
-                                
-                                <!-- Footer -->
-                                <div style="background-color: #f7fafc; padding: 30px; text-align: center; border-top: 1px solid #e2e8f0;">
-                                    <p style="color: #718096; font-size: 13px; margin: 0 0 10px 0;">
-                                        This is an automated notification. Please do not reply to this email.
-                                    </p>
-                                    <p style="color: #a0aec0; font-size: 12px; margin: 0;">
-                                        © {datetime.now().year} University Academic Services. All rights reserved.
-                                    </p>
-                                </div>
-                                
-                            </div>
-                        </body>
-                    </html>
-                    """
-
-                    # Plain text version
-                    text_body = f"""
-                    MAKEUP CLASS NOTIFICATION
-                    ═══════════════════════════════════════
-
-                    Dear Student,
-
-                    We are writing to inform you about a scheduled makeup class for {req.course_name}.
-
-                    CLASS DETAILS:
-                    ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-                    Course:     {req.course_name}
-                    Date:       {req.booked_day}
-                    Time:       {req.booked_start_time} - {req.booked_end_time}
-                    Venue:      {req.booked_lr}
-
-                    ⚠️ IMPORTANT: Your attendance is mandatory for this makeup class.
-
-                    If you have any conflicts or questions, please contact the academic office immediately.
-
-                    Best regards,
-                    Academic Scheduling Department
-
-                    ---
-                    This is an automated notification.
-                    © {datetime.now().year} University Academic Services
-                    """
-                    part1 = MIMEText(text_body, "plain")
-                    part2 = MIMEText(html_body, "html")
-                    msg.attach(part1)
-                    msg.attach(part2)
-
-                    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-                        server.starttls()
-                        server.login(SMTP_USER, SMTP_PASSWORD)
-                        server.send_message(msg)
-                
-            return {"success":"Booked Successfully."}        
-            
-    return "Error booking and sending the data"
+        "lr":req.booked_lr,
+    }
 
-@app.post("/generate-response")
-async def generate_response(req:Request):
-    data = await req.json()
+@app.post("/book-makeups")
+async def book_makeups(reqs:List[BookMakeupRequest], claims:dict = Depends(session_claims)):
+    if not reqs:
+        return booking_error(400,"empty","No makeups to book.")
+    if len(reqs) > BOOK_MAKEUPS_LIMIT:
+        return booking_error(400,"too_many",f"At most {BOOK_MAKEUPS_LIMIT} makeups can be booked at once.")
+    # validate the whole batch before touching the database
+    results = [None] * len(reqs)
+    accepted = []
+    for index, req in enumerate(reqs):
+        if claims["sub"] != req.p_id:
+            results[index] = {"index":index,"error":"forbidden","detail":"Session does not belong to this teacher."}
+            continue
+        detail = booking_times_error(req)
+        if detail is not None:
+            results[index] = {"index":index,"error":"invalid","detail":detail}
+            continue
+        start, end = valid_range(req.booked_start_time,req.booked_end_time)
+        clash = next((other for other, other_start, other_end in accepted if reqs[other].booked_lr == req.booked_lr and reqs[other].booked_day == req.booked_day and start < other_end and other_start < end), None)
+        if clash is not None:
+            results[index] = {"index":index,"error":"conflict","detail":"Overlaps another makeup in this batch.","conflict":{"index":clash}}
+            continue
+        accepted.append((index, start, end))
+
+    booked = []
+    if accepted:
+        items = [{
+            "p_id":reqs[index].p_id,
+            "lr":reqs[index].booked_lr,
+            "day":reqs[index].booked_day,
+            "start_time":reqs[index].booked_start_time,
+            "end_time":reqs[index].booked_end_time,
+            "course_name":reqs[index].course_name,
+            "course_day":reqs[index].course_day,
+            "course_start_time":reqs[index].course_start_time,
+            "course_end_time":reqs[index].course_end_time,
+        } for index, _, _ in accepted]
+        res = await repo.book_makeups(items)
+        for item in res.get("results", []):
+            index = accepted[item["index"]][0]
+            if item.get("status") == "ok":
+                req = reqs[index]
+                booked.append((index, item.get("students", [])))
+                await room_reserved(req.booked_lr,req.booked_day,req.booked_start_time,req.booked_end_time,req.course_name)
+                results[index] = {"index":index,"success":"Booked Successfully."}
+            else:
+                results[index] = {"index":index,"error":"conflict","detail":"This room is already reserved for an overlapping slot.","conflict":item.get("conflict")}
+        await cache.invalidate(f"makeups:{claims['sub']}")
+        await versions.bump_teacher(claims["sub"])
+
+    # one mail per student: students in a single booked section get the usual
+    # alert, students in several get one digest listing all of them
+    sections_per_mail = {}
+    for index, mails in booked:
+        for mail in mails:
+            sections_per_mail.setdefault(mail, []).append(index)
+    mails_per_group = {}
+    dispatcher = get_email_dispatcher()
+    for mail, indexes in sections_per_mail.items():
+        mails_per_group.setdefault(tuple(indexes), []).append(mail)
+    for indexes, mails in mails_per_group.items():
+        if len(indexes) == 1:
+            notification = makeup_scheduled.render(dispatcher.user, **notification_fields(reqs[indexes[0]]))
+        else:
+            notification = makeup_digest.render(dispatcher.user, [notification_fields(reqs[index]) for index in indexes])
+        for address, message in notification.recipients(mails):
+            dispatcher.enqueue(address, message)
+
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = {"index":index,"error":"error","detail":"Error booking and sending the data"}
+    return {"results":results}
+
+def prepare_prompt(data):
     history = data.get("history", [])
     user_message = data.get("message")
     selected_course_free_slots_information = data.get("free_slots_info")
-    system_prompt = {
-    "role": "system",
-    "content": f"""
-You are a helpful scheduling assistant for the 'Makeup' app used by Iqra University Faculty to book makeup classes. Be conversational, brief, and actionable. Do not reply in markdown. Always reply in normal English.
-
-IMPORTANT INSTRUCTIONS:
-- Only provide free slots or recommendations when the user **explicitly asks** for them (e.g., 'available slots', 'free time', 'recommend a time').
-- If the user is just greeting or making small talk (like 'hello', 'hi'), respond naturally without suggesting slots.
-- Keep responses concise: 2-3 sentences maximum.
-- Be direct and helpful, not robotic.
-- When providing slots, focus on GREEN status slots (most students available).
-
-DATA EXPLANATION:
-- GREEN status = Most students (50%+) can attend — RECOMMEND these
-- RED status = Most students have conflicts — AVOID these
-- Each room number (like "14", "36", "23") has different available time slots
-
-RESPONSE STYLE:
-✅ Good: "I found 3 great options! Room 36 has slots from 08:00-11:00 and 11:00-14:00. Room 30 is also free from 11:00-14:00."
-❌ Bad: Responding with slot suggestions when the user did not ask for availability.
-
-Only suggest slots **if the user asks about available times**.
-
-Available Data:
-{selected_course_free_slots_information}
-"""
-}
-
-    messages = (
-        [system_prompt] +
-        history +
-        [{"role": "user", "content": user_message}]
-    )
+    # slots go into the prompt grouped by time range instead of as raw json
+    compact_slots = encode_free_slots(selected_course_free_slots_information)
+    answer_cache.record_compaction(str(selected_course_free_slots_information),compact_slots)
+    messages = build_messages(history,user_message,compact_slots)
+    return messages, answer_cache.key(user_message,compact_slots,history)
+
+async def complete(messages, cache_key):
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
-        response = client.invoke(messages)
-        print(response.content)
+        started = time.perf_counter()
+        with timed("llm","invoke"):
+            response = await get_client().ainvoke(messages)
+        completion_stats.record_completion(time.perf_counter() - started)
+        answer_cache.set(cache_key,response.content)
         return response.content
     except:
+        completion_stats.record_error()
+        return None
+
+# every token chunk is a json encoded string in a "data:" line, the stream
+# ends with an "end" event (or "error" if the model failed). on_answer gets
+# the whole answer once it is complete
+async def answer_events(req, messages, cache_key, on_answer=None):
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        if on_answer is not None:
+            on_answer(cached)
+        yield f"data: {json.dumps(cached)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+        return
+    started = time.perf_counter()
+    first_token = True
+    chunks = []
+    try:
+        with timed("llm","stream"):
+            async for chunk in get_client().astream(messages):
+                if await req.is_disconnected():
+                    completion_stats.record_cancelled()
+                    return
+                if not chunk.content:
+                    continue
+                if first_token:
+                    completion_stats.record_first_token(time.perf_counter() - started)
+                    dependency_latency.observe(("llm","first_token","ok"),time.perf_counter() - started)
+                    first_token = False
+                chunks.append(chunk.content)
+                yield f"data: {json.dumps(chunk.content)}\n\n"
+        completion_stats.record_completion(time.perf_counter() - started)
+        answer = "".join(chunks)
+        answer_cache.set(cache_key,answer)
+        if on_answer is not None:
+            on_answer(answer)
+        yield "event: end\ndata: {}\n\n"
+    except asyncio.CancelledError:
+        # client went away, closing the generator stops the upstream stream
+        completion_stats.record_cancelled()
+        raise
+    except Exception:
+        completion_stats.record_error()
+        yield f"event: error\ndata: {json.dumps('Not available at the moment.')}\n\n"
+
+def event_stream(events):
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control":"no-cache","X-Accel-Buffering":"no"})
+
+@app.post("/generate-response")
+async def generate_response(req:Request):
+    data = await req.json()
+    messages, cache_key = prepare_prompt(data)
+    answer = await complete(messages, cache_key)
+    if answer is None:
         return "Not available at the moment."
+    return answer
+
+# same body as /generate-response, answered as server-sent events
+@app.post("/generate-response/stream")
+async def generate_response_stream(req:Request):
+    data = await req.json()
+    messages, cache_key = prepare_prompt(data)
+    return event_stream(answer_events(req, messages, cache_key))
+
+# chat sessions: the history and slot context stay on the server, so a
+# message only carries {"message"} (plus "free_slots_info" when the teacher
+# switched course). old turns are trimmed to CHAT_HISTORY_TOKENS
+def conversation_not_found():
+    return JSONResponse(status_code=404, content={"error":"not_found","detail":"Chat session expired or not found."})
+
+def conversation_prompt(conversation, data, payload_bytes):
+    if data.get("free_slots_info") is not None:
+        conversation.free_slots = encode_free_slots(data.get("free_slots_info"))
+        answer_cache.record_compaction(str(data.get("free_slots_info")),conversation.free_slots)
+    user_message = data.get("message")
+    messages = build_messages(conversation.context(),user_message,conversation.free_slots)
+    conversation.record_request(payload_bytes,sum(estimate_tokens(message["content"] or "") for message in messages))
+    # the session and everything the model sees before the message are part
+    # of the key, so a "yes" never gets another conversation's answer
+    return user_message, messages, answer_cache.key(user_message,conversation.free_slots,{"session":conversation.id,"context":conversation.context()})
+
+@app.post("/chat-sessions")
+async def create_chat_session(req:Request):
+    data = await req.json()
+    compact_slots = encode_free_slots(data.get("free_slots_info"))
+    answer_cache.record_compaction(str(data.get("free_slots_info")),compact_slots)
+    conversation = conversations.create(compact_slots,data.get("history"))
+    return {"session_id":conversation.id,"expires_in":int(conversations.ttl)}
+
+@app.post("/chat-sessions/{session_id}/messages")
+async def chat_session_message(session_id:str, req:Request):
+    conversation = conversations.get(session_id)
+    if conversation is None:
+        return conversation_not_found()
+    body = await req.body()
+    user_message, messages, cache_key = conversation_prompt(conversation, json.loads(body), len(body))
+    answer = await complete(messages, cache_key)
+    if answer is None:
+        conversations.save(conversation)
+        return "Not available at the moment."
+    conversation.add_turn(user_message or "",answer)
+    conversations.save(conversation)
+    return answer
+
+@app.post("/chat-sessions/{session_id}/messages/stream")
+async def chat_session_message_stream(session_id:str, req:Request):
+    conversation = conversations.get(session_id)
+    if conversation is None:
+        return conversation_not_found()
+    body = await req.body()
+    user_message, messages, cache_key = conversation_prompt(conversation, json.loads(body), len(body))
+    conversations.save(conversation)
+
+    def on_answer(answer):
+        conversation.add_turn(user_message or "",answer)
+        conversations.save(conversation)
+
+    return event_stream(answer_events(req, messages, cache_key, on_answer))
+
+@app.get("/chat-sessions/{session_id}")
+async def chat_session_stats(session_id:str):
+    conversation = conversations.get(session_id)
+    if conversation is None:
+        return conversation_not_found()
+    return conversation.describe()
+
+@app.delete("/chat-sessions/{session_id}")
+async def delete_chat_session(session_id:str):
+    conversations.delete(session_id)
+    return {"success":"Chat session closed."}
+
+async def load_makeups(p_id):
+    res = await cache.get(f"makeups:{p_id}")
+    if res is MISSING:
+        res = await repo.get_makeups(p_id)
+        await cache.set(f"makeups:{p_id}",res)
+    if res:
+        return res
+    return "No Makeups Available"
+
+@app.get("/get-makeups")
+async def get_makeups(p_id:str, request:Request, response:Response, claims:dict = Depends(session_claims)):
+    require_owner(claims,p_id)
+    etag = await versions.teacher_etag("makeups",p_id)
+    cached = not_modified(request,etag,"private, no-cache")
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return await load_makeups(p_id)
 
 @app.post("/get-makeups")
-async def get_makeups(req:Request):
+async def post_get_makeups(req:Request, claims:dict = Depends(session_claims)):
     data = await req.json()
     p_id = data.get("p_id")
-    res = supabase.table("makeup_classes").select("*").eq("p_id",p_id).execute()
-    if res.data:
-        return res.data
-    return "No Makeups Available"
+    require_owner(claims,p_id)
+    return await load_makeups(p_id)
+
+# scrape time gauges and counters for the queues / pools behind the histograms
+# scrapes never build the dispatcher, it only exists once a mail was queued
+registry.gauge("email_queue_depth","Notifications waiting to be sent.",lambda: email_dispatcher.queue_depth() if email_dispatcher is not None else 0)
+registry.gauge("bcrypt_in_flight","Hash/verify calls running or queued in the bcrypt pool.",lambda: hasher.in_flight)
+registry.counter("bcrypt_rejected_total","Hash/verify calls turned away because the pool was full.",lambda: hasher.rejected)
+registry.counter("cache_hits_total","Read-through cache hits.",lambda: cache.hits)
+registry.counter("cache_misses_total","Read-through cache misses.",lambda: cache.misses)
+registry.counter("not_modified_total","Conditional reads answered with 304.",lambda: versions.not_modified)
+registry.counter("free_slots_computed_total","Free slot queries that ran their own computation.",lambda: free_slot_flights.computed)
+registry.counter("free_slots_deduplicated_total","Free slot queries answered by a shared in-flight or recent computation.",lambda: free_slot_flights.coalesced + free_slot_flights.reused)
+registry.gauge("chat_sessions","Chat sessions held in memory.",lambda: len(conversations.sessions))
+registry.gauge("live_subscribers","Open /ws/free-slots subscriptions.",lambda: slot_hub.stats()["subscribers"])
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(),media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats():
+    return {"email": email_dispatcher.stats() if email_dispatcher is not None else {"queue_depth":0}, "hashing": hasher.stats(), "cache": cache.stats(), "roster": availability.roster.stats() if availability is not None else None, "llm": completion_stats.stats(), "answers": answer_cache.stats(), "live": slot_hub.stats(), "versions": versions.stats(), "free_slots": free_slot_flights.stats(), "chat": conversations.stats()}
 
 @app.get("/")
-def root():
+async def root():
     return "Makeup Application Server is running on port 8000"
\ No newline at end of file
@@ -0,0 +1,146 @@
+# prometheus style latency histograms for routes and dependencies (supabase,
+# smtp, bcrypt, llm), plus optional sampled per-request trace logs
+import os
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+trace_logger = logging.getLogger("trace")
+
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# nothing else configures logging, so sampled traces get their own stderr
+# handler (one json object per line) unless the deployment attached one
+if TRACE_SAMPLE_RATE and not trace_logger.handlers:
+    _trace_handler = logging.StreamHandler()
+    _trace_handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_logger.addHandler(_trace_handler)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+# spans of the current request when it was picked for tracing
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self.series.items())
+            for labels, (counts, total, count) in items:
+                for bound, bucket_count in zip(self.buckets, counts):
+                    bucket_labels = _labels(self.labelnames, labels, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                inf_labels = _labels(self.labelnames, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf_labels} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        self.gauges = []
+        self.counters = []
+
+    def histogram(self, name, help, labelnames, buckets=LATENCY_BUCKETS):
+        histogram = Histogram(name, help, labelnames, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def gauge(self, name, help, read):
+        # read() is called at scrape time
+        self.gauges.append((name, help, read))
+
+    def counter(self, name, help, read):
+        # like gauge, but read() only ever grows (names end in _total)
+        self.counters.append((name, help, read))
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for kind, readings in (("gauge", self.gauges), ("counter", self.counters)):
+            for name, help, read in readings:
+                try:
+                    value = read()
+                except Exception:
+                    continue
+                lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+request_latency = registry.histogram(
+    "http_request_duration_seconds", "Time to produce the response headers per route.", ("method", "route", "status"))
+dependency_latency = registry.histogram(
+    "dependency_duration_seconds", "Time spent in supabase, smtp, bcrypt and llm calls.", ("dependency", "operation", "outcome"))
+
+
+@contextmanager
+def timed(dependency, operation):
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        dependency_latency.observe((dependency, operation, outcome), elapsed)
+        spans = current_trace.get()
+        if spans is not None:
+            spans.append({"dependency": dependency, "operation": operation, "outcome": outcome, "ms": round(elapsed * 1000, 3)})
+
+
+def start_trace():
+    if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE:
+        spans = []
+        current_trace.set(spans)
+        return spans
+    return None
+
+def log_trace(method, route, status, elapsed, spans):
+    trace_logger.info(json.dumps({
+        "method": method,
+        "route": route,
+        "status": status,
+        "ms": round(elapsed * 1000, 3),
+        "spans": spans,
+    }))
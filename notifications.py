@@ -0,0 +1,439 @@
+# precompiled notification templates, rendered once per booking event
+import logging
+from string import Template
+from email.errors import HeaderParseError
+from email.headerregistry import Address
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from datetime import datetime
+
+logger = logging.getLogger("notifications")
+
+
+def recipient_address(to_addr):
+    # a plain addr-spec with an idna domain, or None for anything that could
+    # break the To header (cr/lf, display names, non ascii local parts)
+    if not isinstance(to_addr, str) or any(c in to_addr for c in "\r\n\0"):
+        return None
+    try:
+        address = Address(addr_spec=to_addr.strip())
+        domain = address.domain.encode("idna").decode("ascii")
+    except (ValueError, IndexError, HeaderParseError, UnicodeError):
+        return None
+    if not address.username or not domain:
+        return None
+    return f"{address.username}@{domain}"
+
+
+class NotificationTemplate:
+    def __init__(self, subject, html, text):
+        self.subject = subject
+        self.html = Template(html)
+        self.text = Template(text)
+
+    def render(self, sender, **fields):
+        fields.setdefault("year", datetime.now().year)
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = self.subject
+        msg["From"] = sender
+        msg.attach(MIMEText(self.text.substitute(fields), "plain"))
+        msg.attach(MIMEText(self.html.substitute(fields), "html"))
+        # serialise once, recipients only add their own To header
+        return RenderedNotification(msg.as_bytes(policy=msg.policy.clone(linesep="\r\n")))
+
+
+class DigestTemplate:
+    # one mail listing several classes, each class rendered from a card template
+    def __init__(self, subject, html, html_card, text, text_card):
+        self.subject = subject
+        self.html = Template(html)
+        self.html_card = Template(html_card)
+        self.text = Template(text)
+        self.text_card = Template(text_card)
+
+    def render(self, sender, classes):
+        fields = {"year": datetime.now().year, "count": len(classes)}
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = self.subject
+        msg["From"] = sender
+        text_cards = "".join(self.text_card.substitute(c) for c in classes)
+        html_cards = "".join(self.html_card.substitute(c) for c in classes)
+        msg.attach(MIMEText(self.text.substitute(fields, classes=text_cards), "plain"))
+        msg.attach(MIMEText(self.html.substitute(fields, classes=html_cards), "html"))
+        return RenderedNotification(msg.as_bytes(policy=msg.policy.clone(linesep="\r\n")))
+
+
+class RenderedNotification:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def for_recipient(self, to_addr):
+        address = recipient_address(to_addr)
+        if address is None:
+            raise ValueError(f"invalid recipient {to_addr!r}")
+        return b"To: " + address.encode("ascii") + b"\r\n" + self.payload
+
+    def recipients(self, mails):
+        # (address, message) per usable mail, bad ones are logged and skipped
+        # so one broken roster row doesn't cost the rest of the section
+        for mail in mails:
+            address = recipient_address(mail)
+            if address is None:
+                logger.warning("skipping invalid recipient %r", mail)
+                continue
+            yield address, b"To: " + address.encode("ascii") + b"\r\n" + self.payload
+
+
+MAKEUP_SCHEDULED_HTML = """
+                    <html>
+                        <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f4f7fa;">
+                            <div style="max-width: 650px; margin: 40px auto; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08);">
+                                
+                                <!-- Header -->
+                                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px 30px; text-align: center;">
+                                    <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 600; letter-spacing: -0.5px;">
+                                        📚 Makeup Class Scheduled
+                                    </h1>
+                                    <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
+                                        Important Academic Update
+                                    </p>
+                                </div>
+                                
+                                <!-- Main Content -->
+                                <div style="padding: 40px 30px;">
+                                    <p style="color: #2d3748; font-size: 16px; line-height: 1.6; margin: 0 0 20px 0;">
+                                        Dear <strong>Student</strong>,
+                                    </p>
+                                    
+                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 30px 0;">
+                                        We are writing to inform you about a scheduled makeup class for <strong style="color: #667eea;">$course_name</strong>. 
+                                        Please review the details below and mark your calendar accordingly.
+                                    </p>
+                                    
+                                    <!-- Class Details Card -->
+                                    <div style="background: linear-gradient(135deg, #f6f8fb 0%, #e9ecef 100%); border-left: 4px solid #667eea; padding: 25px; border-radius: 12px; margin-bottom: 30px;">
+                                        <h3 style="color: #1a202c; margin: 0 0 20px 0; font-size: 18px; font-weight: 600;">
+                                            Class Information
+                                        </h3>
+                                        
+                                        <div style="margin-bottom: 15px;">
+                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">📖 Course:</span>
+                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">$course_name</span>
+                                        </div>
+                                        
+                                        <div style="margin-bottom: 15px;">
+                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">📅 Date:</span>
+                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">$day</span>
+                                        </div>
+                                        
+                                        <div style="margin-bottom: 15px;">
+                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">🕒 Time:</span>
+                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">$start_time - $end_time</span>
+                                        </div>
+                                        
+                                        <div style="margin-bottom: 0;">
+                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">📍 Venue:</span>
+                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">$lr</span>
+                                        </div>
+                                    </div>
+                                    
+                                    <!-- Important Notice -->
+                                    <div style="background-color: #fff5e6; border-left: 4px solid #f59e0b; padding: 20px; border-radius: 8px; margin-bottom: 30px;">
+                                        <p style="color: #92400e; margin: 0; font-size: 14px; line-height: 1.6;">
+                                            <strong>⚠️ Attendance Mandatory:</strong> Your presence in this makeup class is essential. 
+                                            Please ensure you arrive on time and bring all necessary materials.
+                                        </p>
+                                    </div>
+                                    
+                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 10px 0;">
+                                        If you have any conflicts or questions regarding this schedule, please contact the academic office 
+                                        at your earliest convenience.
+                                    </p>
+                                    
+                                    <p style="color: #2d3748; font-size: 15px; margin: 20px 0 0 0;">
+                                        Best regards,<br>
+                                        <strong style="color: #667eea;">Academic Scheduling Department</strong>
+                                    </p>
+                                </div>
+                                
+                                <!-- Footer -->
+                                <div style="background-color: #f7fafc; padding: 30px; text-align: center; border-top: 1px solid #e2e8f0;">
+                                    <p style="color: #718096; font-size: 13px; margin: 0 0 10px 0;">
+                                        This is an automated notification. Please do not reply to this email.
+                                    </p>
+                                    <p style="color: #a0aec0; font-size: 12px; margin: 0;">
+                                        © $year University Academic Services. All rights reserved.
+                                    </p>
+                                </div>
+                                
+                            </div>
+                        </body>
+                    </html>
+                    """
+
+MAKEUP_SCHEDULED_TEXT = """
+                    MAKEUP CLASS NOTIFICATION
+                    ═══════════════════════════════════════
+
+                    Dear Student,
+
+                    We are writing to inform you about a scheduled makeup class for $course_name.
+
+                    CLASS DETAILS:
+                    ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+                    Course:     $course_name
+                    Date:       $day
+                    Time:       $start_time - $end_time
+                    Venue:      $lr
+
+                    ⚠️ IMPORTANT: Your attendance is mandatory for this makeup class.
+
+                    If you have any conflicts or questions, please contact the academic office immediately.
+
+                    Best regards,
+                    Academic Scheduling Department
+
+                    ---
+                    This is an automated notification.
+                    © $year University Academic Services
+                    """
+
+MAKEUP_CANCELLED_HTML = """
+                    <html>
+                        <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f4f7fa;">
+                            <div style="max-width: 650px; margin: 40px auto; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08);">
+                                
+                                <!-- Header -->
+                                <div style="background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%); padding: 40px 30px; text-align: center;">
+                                    <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 600; letter-spacing: -0.5px;">
+                                        ⚠️ Makeup Class Cancelled
+                                    </h1>
+                                    <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
+                                        Important Schedule Update
+                                    </p>
+                                </div>
+                                
+                                <!-- Main Content -->
+                                <div style="padding: 40px 30px;">
+                                    <p style="color: #2d3748; font-size: 16px; line-height: 1.6; margin: 0 0 20px 0;">
+                                        Dear <strong>Student</strong>,
+                                    </p>
+                                    
+                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 30px 0;">
+                                        We regret to inform you that the previously scheduled makeup class for <strong style="color: #ef4444;">$course_name</strong> 
+                                        has been <strong>cancelled</strong>. Please see the cancelled class details below.
+                                    </p>
+                                    
+                                    <!-- Cancelled Class Details Card -->
+                                    <div style="background: linear-gradient(135deg, #fee2e2 0%, #fecaca 100%); border-left: 4px solid #ef4444; padding: 25px; border-radius: 12px; margin-bottom: 30px;">
+                                        <h3 style="color: #991b1b; margin: 0 0 20px 0; font-size: 18px; font-weight: 600;">
+                                            Cancelled Class Information
+                                        </h3>
+                                        
+                                        <div style="margin-bottom: 15px;">
+                                            <span style="color: #7f1d1d; font-size: 14px; display: inline-block; width: 120px;">📖 Course:</span>
+                                            <span style="color: #991b1b; font-size: 15px; font-weight: 600; text-decoration: line-through;">$course_name</span>
+                                        </div>
+                                        
+                                        <div style="margin-bottom: 15px;">
+                                            <span style="color: #7f1d1d; font-size: 14px; display: inline-block; width: 120px;">📅 Date:</span>
+                                            <span style="color: #991b1b; font-size: 15px; font-weight: 600; text-decoration: line-through;">$day</span>
+                                        </div>
+                                        
+                                        <div style="margin-bottom: 15px;">
+                                            <span style="color: #7f1d1d; font-size: 14px; display: inline-block; width: 120px;">🕒 Time:</span>
+                                            <span style="color: #991b1b; font-size: 15px; font-weight: 600; text-decoration: line-through;">$start_time - $end_time</span>
+                                        </div>
+                                        
+                                        <div style="margin-bottom: 0;">
+                                            <span style="color: #7f1d1d; font-size: 14px; display: inline-block; width: 120px;">📍 Venue:</span>
+                                            <span style="color: #991b1b; font-size: 15px; font-weight: 600; text-decoration: line-through;">$lr</span>
+                                        </div>
+                                    </div>
+                                    
+                                    <!-- Important Notice -->
+                                    <div style="background-color: #fef3c7; border-left: 4px solid #f59e0b; padding: 20px; border-radius: 8px; margin-bottom: 30px;">
+                                        <p style="color: #92400e; margin: 0; font-size: 14px; line-height: 1.6;">
+                                            <strong>📢 Status:</strong> This makeup class has been officially cancelled. 
+                                            You do <strong>NOT</strong> need to attend. A new schedule will be communicated separately if rescheduled.
+                                        </p>
+                                    </div>
+                                    
+                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 10px 0;">
+                                        We apologize for any inconvenience this may cause. If you have any questions or concerns regarding this cancellation, 
+                                        please contact the academic office at your earliest convenience.
+                                    </p>
+                                    
+                                    <p style="color: #2d3748; font-size: 15px; margin: 20px 0 0 0;">
+                                        Best regards,<br>
+                                        <strong style="color: #ef4444;">Academic Scheduling Department</strong>
+                                    </p>
+                                </div>
+                                
+                                <!-- Footer -->
+                                <div style="background-color: #f7fafc; padding: 30px; text-align: center; border-top: 1px solid #e2e8f0;">
+                                    <p style="color: #718096; font-size: 13px; margin: 0 0 10px 0;">
+                                        This is an automated notification. Please do not reply to this email.
+                                    </p>
+                                    <p style="color: #a0aec0; font-size: 12px; margin: 0;">
+                                        © $year University Academic Services. All rights reserved.
+                                    </p>
+                                </div>
+                                
+                            </div>
+                        </body>
+                    </html>
+                    """
+
+MAKEUP_CANCELLED_TEXT = """
+                    MAKEUP CLASS CANCELLATION NOTICE
+                    ═══════════════════════════════════════
+
+                    Dear Student,
+
+                    We regret to inform you that the previously scheduled makeup class for $course_name has been CANCELLED.
+
+                    CANCELLED CLASS DETAILS:
+                    ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+                    Course:     $course_name [CANCELLED]
+                    Date:       $day [CANCELLED]
+                    Time:       $start_time - $end_time [CANCELLED]
+                    Venue:      $lr [CANCELLED]
+
+                    📢 STATUS: This makeup class has been officially cancelled.
+                    You do NOT need to attend.
+
+                    A new schedule will be communicated separately if the class is rescheduled.
+
+                    We apologize for any inconvenience this may cause. If you have any questions or concerns, 
+                    please contact the academic office immediately.
+
+                    Best regards,
+                    Academic Scheduling Department
+
+                    ---
+                    This is an automated notification.
+                    © $year University Academic Services
+                    """
+
+MAKEUP_DIGEST_HTML = """
+                    <html>
+                        <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f4f7fa;">
+                            <div style="max-width: 650px; margin: 40px auto; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08);">
+                                
+                                <!-- Header -->
+                                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px 30px; text-align: center;">
+                                    <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 600; letter-spacing: -0.5px;">
+                                        📚 Makeup Classes Scheduled
+                                    </h1>
+                                    <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
+                                        Important Academic Update
+                                    </p>
+                                </div>
+                                
+                                <!-- Main Content -->
+                                <div style="padding: 40px 30px;">
+                                    <p style="color: #2d3748; font-size: 16px; line-height: 1.6; margin: 0 0 20px 0;">
+                                        Dear <strong>Student</strong>,
+                                    </p>
+                                    
+                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 30px 0;">
+                                        We are writing to inform you about <strong style="color: #667eea;">$count</strong> scheduled makeup classes for your courses. 
+                                        Please review the details below and mark your calendar accordingly.
+                                    </p>
+                                    
+$classes                                    <!-- Important Notice -->
+                                    <div style="background-color: #fff5e6; border-left: 4px solid #f59e0b; padding: 20px; border-radius: 8px; margin-bottom: 30px;">
+                                        <p style="color: #92400e; margin: 0; font-size: 14px; line-height: 1.6;">
+                                            <strong>⚠️ Attendance Mandatory:</strong> Your presence in these makeup classes is essential. 
+                                            Please ensure you arrive on time and bring all necessary materials.
+                                        </p>
+                                    </div>
+                                    
+                                    <p style="color: #4a5568; font-size: 15px; line-height: 1.7; margin: 0 0 10px 0;">
+                                        If you have any conflicts or questions regarding this schedule, please contact the academic office 
+                                        at your earliest convenience.
+                                    </p>
+                                    
+                                    <p style="color: #2d3748; font-size: 15px; margin: 20px 0 0 0;">
+                                        Best regards,<br>
+                                        <strong style="color: #667eea;">Academic Scheduling Department</strong>
+                                    </p>
+                                </div>
+                                
+                                <!-- Footer -->
+                                <div style="background-color: #f7fafc; padding: 30px; text-align: center; border-top: 1px solid #e2e8f0;">
+                                    <p style="color: #718096; font-size: 13px; margin: 0 0 10px 0;">
+                                        This is an automated notification. Please do not reply to this email.
+                                    </p>
+                                    <p style="color: #a0aec0; font-size: 12px; margin: 0;">
+                                        © $year University Academic Services. All rights reserved.
+                                    </p>
+                                </div>
+                                
+                            </div>
+                        </body>
+                    </html>
+                    """
+
+MAKEUP_DIGEST_HTML_CARD = """                                    <!-- Class Details Card -->
+                                    <div style="background: linear-gradient(135deg, #f6f8fb 0%, #e9ecef 100%); border-left: 4px solid #667eea; padding: 25px; border-radius: 12px; margin-bottom: 30px;">
+                                        <h3 style="color: #1a202c; margin: 0 0 20px 0; font-size: 18px; font-weight: 600;">
+                                            Class Information
+                                        </h3>
+                                        
+                                        <div style="margin-bottom: 15px;">
+                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">📖 Course:</span>
+                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">$course_name</span>
+                                        </div>
+                                        
+                                        <div style="margin-bottom: 15px;">
+                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">📅 Date:</span>
+                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">$day</span>
+                                        </div>
+                                        
+                                        <div style="margin-bottom: 15px;">
+                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">🕒 Time:</span>
+                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">$start_time - $end_time</span>
+                                        </div>
+                                        
+                                        <div style="margin-bottom: 0;">
+                                            <span style="color: #718096; font-size: 14px; display: inline-block; width: 120px;">📍 Venue:</span>
+                                            <span style="color: #2d3748; font-size: 15px; font-weight: 600;">$lr</span>
+                                        </div>
+                                    </div>
+                                    
+"""
+
+MAKEUP_DIGEST_TEXT = """
+                    MAKEUP CLASSES NOTIFICATION
+                    ═══════════════════════════════════════
+
+                    Dear Student,
+
+                    We are writing to inform you about $count scheduled makeup classes for your courses.
+
+$classes                    ⚠️ IMPORTANT: Your attendance is mandatory for these makeup classes.
+
+                    If you have any conflicts or questions, please contact the academic office immediately.
+
+                    Best regards,
+                    Academic Scheduling Department
+
+                    ---
+                    This is an automated notification.
+                    © $year University Academic Services
+                    """
+
+MAKEUP_DIGEST_TEXT_CARD = """                    $course_name:
+                    ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+                    Course:     $course_name
+                    Date:       $day
+                    Time:       $start_time - $end_time
+                    Venue:      $lr
+
+"""
+
+makeup_scheduled = NotificationTemplate("Makeup Class Alert", MAKEUP_SCHEDULED_HTML, MAKEUP_SCHEDULED_TEXT)
+makeup_cancelled = NotificationTemplate("Makeup Class Cancelled - Action Required", MAKEUP_CANCELLED_HTML, MAKEUP_CANCELLED_TEXT)
+makeup_digest = DigestTemplate("Makeup Classes Alert", MAKEUP_DIGEST_HTML, MAKEUP_DIGEST_HTML_CARD, MAKEUP_DIGEST_TEXT, MAKEUP_DIGEST_TEXT_CARD)
@@ -0,0 +1,55 @@
+# in-memory index of students_assigned_courses keyed by section
+# (course_assigned, day, start_time, end_time) -> tuple of student mails.
+# the availability engine reloads it in full together with its bitsets
+import os
+import sys
+
+ROSTER_PAGE_SIZE = int(os.environ.get("ROSTER_PAGE_SIZE", "1000"))
+
+
+def section_key(course_name, day, start_time, end_time):
+    return (sys.intern(course_name), sys.intern(day), sys.intern(start_time), sys.intern(end_time))
+
+
+class RosterIndex:
+    def __init__(self, repo, page_size=ROSTER_PAGE_SIZE):
+        self.repo = repo
+        self.page_size = page_size
+        self.sections = {}
+        self.full_loads = 0
+
+    async def load(self):
+        # one full pass over the table, paged so big rosters don't come back as one response
+        sections = {}
+        offset = 0
+        while True:
+            rows = await self.repo.get_enrollments(offset, self.page_size)
+            for row in rows:
+                key = section_key(row["course_assigned"], row["day"], row["start_time"], row["end_time"])
+                sections.setdefault(key, []).append(sys.intern(row["s_mail"]))
+            if len(rows) < self.page_size:
+                break
+            offset += self.page_size
+        self.sections = {key: tuple(mails) for key, mails in sections.items()}
+        self.full_loads += 1
+
+    def memory_bytes(self):
+        size = sys.getsizeof(self.sections)
+        strings = set()
+        for key, mails in self.sections.items():
+            size += sys.getsizeof(key) + sys.getsizeof(mails)
+            strings.update(key)
+            strings.update(mails)
+        # interned strings are shared, so each one is only counted once
+        return size + sum(sys.getsizeof(value) for value in strings)
+
+    def stats(self):
+        enrollments = sum(len(mails) for mails in self.sections.values())
+        memory = self.memory_bytes()
+        return {
+            "sections": len(self.sections),
+            "enrollments": enrollments,
+            "memory_bytes": memory,
+            "bytes_per_10k_enrollments": round(memory / enrollments * 10000) if enrollments else 0,
+            "full_loads": self.full_loads,
+        }
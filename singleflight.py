@@ -0,0 +1,58 @@
+# request coalescing: identical concurrent calls share one in-flight
+# computation, and its result is reused for a short while after it lands
+import os
+import time
+import asyncio
+
+COALESCE_TTL = float(os.environ.get("COALESCE_TTL", "2"))
+
+
+class SingleFlight:
+    def __init__(self, ttl=COALESCE_TTL):
+        self.ttl = ttl
+        self.in_flight = {}
+        self.results = {}
+        self.computed = 0
+        self.coalesced = 0
+        self.reused = 0
+        self.failed = 0
+
+    async def run(self, key, compute):
+        hit = self.results.get(key)
+        if hit is not None and time.monotonic() < hit[0]:
+            self.reused += 1
+            return hit[1]
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.computed += 1
+            # a task of its own, so the caller that started it going away
+            # doesn't cancel it for everyone else waiting on it
+            task = self.in_flight[key] = asyncio.create_task(compute())
+            task.add_done_callback(lambda done: self._landed(key, done))
+        return await asyncio.shield(task)
+
+    def _landed(self, key, task):
+        self.in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            # failures are never reused, the next caller tries again
+            self.failed += 1
+            return
+        now = time.monotonic()
+        for stale in [k for k, (expires, _) in self.results.items() if expires <= now]:
+            del self.results[stale]
+        if self.ttl > 0:
+            self.results[key] = (now + self.ttl, task.result())
+
+    def stats(self):
+        calls = self.computed + self.coalesced + self.reused
+        return {
+            "in_flight": len(self.in_flight),
+            "cached": len(self.results),
+            "computed": self.computed,
+            "coalesced": self.coalesced,
+            "reused": self.reused,
+            "failed": self.failed,
+            "deduplicated_share": (self.coalesced + self.reused) / calls if calls else 0.0,
+        }
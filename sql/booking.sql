@@ -0,0 +1,198 @@
+-- single round trip booking / cancellation for the makeup app.
+-- run once in the supabase sql editor; the api calls these through
+-- /rest/v1/rpc/book_makeup_tx and /rest/v1/rpc/cancel_makeup_tx.
+-- times are compared as ::time on both sides, so "08:00" matches a stored
+-- "08:00:00" whether the columns are time or text
+
+create or replace function book_makeup_tx(
+    p_id text,
+    lr text,
+    day text,
+    start_time text,
+    end_time text,
+    course_name text,
+    course_day text,
+    course_start_time text,
+    course_end_time text
+) returns jsonb
+language plpgsql
+as $$
+declare
+    clash record;
+begin
+    -- serialise bookings for the same room and day so two teachers can't
+    -- both pass the conflict check
+    perform pg_advisory_xact_lock(hashtext('lr_reserved:' || book_makeup_tx.lr || ':' || book_makeup_tx.day));
+
+    select r.lr, r.day, r.start_time, r.end_time, r.course_name into clash
+    from lr_reserved r
+    where r.lr = book_makeup_tx.lr
+      and r.day = book_makeup_tx.day
+      and r.start_time::time < book_makeup_tx.end_time::time
+      and r.end_time::time > book_makeup_tx.start_time::time
+    limit 1;
+
+    if found then
+        return jsonb_build_object(
+            'status', 'conflict',
+            'conflict', jsonb_build_object(
+                'lr', clash.lr,
+                'day', clash.day,
+                'start_time', clash.start_time,
+                'end_time', clash.end_time,
+                'course_name', clash.course_name
+            )
+        );
+    end if;
+
+    insert into makeup_classes (p_id, lr, start_time, end_time, day, course_name, course_day, course_start_time, course_end_time)
+    values (book_makeup_tx.p_id, book_makeup_tx.lr, book_makeup_tx.start_time, book_makeup_tx.end_time, book_makeup_tx.day,
+            book_makeup_tx.course_name, book_makeup_tx.course_day, book_makeup_tx.course_start_time, book_makeup_tx.course_end_time);
+
+    insert into lr_reserved (lr, course_name, day, start_time, end_time)
+    values (book_makeup_tx.lr, book_makeup_tx.course_name, book_makeup_tx.day, book_makeup_tx.start_time, book_makeup_tx.end_time);
+
+    return jsonb_build_object(
+        'status', 'ok',
+        'students', coalesce((
+            select jsonb_agg(s.s_mail)
+            from students_assigned_courses s
+            where s.course_assigned = book_makeup_tx.course_name
+              and s.day = book_makeup_tx.course_day
+              and s.start_time::time = book_makeup_tx.course_start_time::time
+              and s.end_time::time = book_makeup_tx.course_end_time::time
+        ), '[]'::jsonb)
+    );
+end;
+$$;
+
+create or replace function cancel_makeup_tx(
+    p_id text,
+    lr text,
+    day text,
+    start_time text,
+    end_time text,
+    course_name text,
+    course_day text,
+    course_start_time text,
+    course_end_time text
+) returns jsonb
+language plpgsql
+as $$
+declare
+    removed integer;
+begin
+    perform pg_advisory_xact_lock(hashtext('lr_reserved:' || cancel_makeup_tx.lr || ':' || cancel_makeup_tx.day));
+
+    delete from makeup_classes m
+    where m.p_id = cancel_makeup_tx.p_id
+      and m.lr = cancel_makeup_tx.lr
+      and m.start_time::time = cancel_makeup_tx.start_time::time
+      and m.end_time::time = cancel_makeup_tx.end_time::time
+      and m.day = cancel_makeup_tx.day
+      and m.course_name = cancel_makeup_tx.course_name
+      and m.course_day = cancel_makeup_tx.course_day
+      and m.course_start_time::time = cancel_makeup_tx.course_start_time::time
+      and m.course_end_time::time = cancel_makeup_tx.course_end_time::time;
+    get diagnostics removed = row_count;
+
+    if removed = 0 then
+        return jsonb_build_object('status', 'not_found');
+    end if;
+
+    delete from lr_reserved r
+    where r.lr = cancel_makeup_tx.lr
+      and r.course_name = cancel_makeup_tx.course_name
+      and r.day = cancel_makeup_tx.day
+      and r.start_time::time = cancel_makeup_tx.start_time::time
+      and r.end_time::time = cancel_makeup_tx.end_time::time;
+
+    return jsonb_build_object(
+        'status', 'ok',
+        'students', coalesce((
+            select jsonb_agg(s.s_mail)
+            from students_assigned_courses s
+            where s.course_assigned = cancel_makeup_tx.course_name
+              and s.day = cancel_makeup_tx.course_day
+              and s.start_time::time = cancel_makeup_tx.course_start_time::time
+              and s.end_time::time = cancel_makeup_tx.course_end_time::time
+        ), '[]'::jsonb)
+    );
+end;
+$$;
+
+-- batch version used by /book-makeups. items is a json array of objects with
+-- the same keys as book_makeup_tx's arguments. conflicting items are reported
+-- per index, the rest are written with one multi-row insert per table
+create or replace function book_makeups_tx(items jsonb) returns jsonb
+language plpgsql
+as $$
+declare
+    item jsonb;
+    idx integer := 0;
+    clash record;
+    accepted jsonb := '[]'::jsonb;
+    results jsonb := '[]'::jsonb;
+begin
+    -- lock every room/day of the batch in a stable order so concurrent
+    -- batches can't deadlock each other
+    perform pg_advisory_xact_lock(hashtext('lr_reserved:' || keys.k))
+    from (
+        select distinct (i ->> 'lr') || ':' || (i ->> 'day') as k
+        from jsonb_array_elements(items) i
+        order by 1
+    ) keys;
+
+    for item in select value from jsonb_array_elements(items) loop
+        select r.lr, r.day, r.start_time, r.end_time, r.course_name into clash
+        from lr_reserved r
+        where r.lr = item ->> 'lr'
+          and r.day = item ->> 'day'
+          and r.start_time::time < (item ->> 'end_time')::time
+          and r.end_time::time > (item ->> 'start_time')::time
+        limit 1;
+
+        if found then
+            results := results || jsonb_build_array(jsonb_build_object(
+                'index', idx,
+                'status', 'conflict',
+                'conflict', jsonb_build_object(
+                    'lr', clash.lr,
+                    'day', clash.day,
+                    'start_time', clash.start_time,
+                    'end_time', clash.end_time,
+                    'course_name', clash.course_name
+                )
+            ));
+        else
+            accepted := accepted || jsonb_build_array(item);
+            results := results || jsonb_build_array(jsonb_build_object(
+                'index', idx,
+                'status', 'ok',
+                'students', coalesce((
+                    select jsonb_agg(s.s_mail)
+                    from students_assigned_courses s
+                    where s.course_assigned = item ->> 'course_name'
+                      and s.day = item ->> 'course_day'
+                      and s.start_time::time = (item ->> 'course_start_time')::time
+                      and s.end_time::time = (item ->> 'course_end_time')::time
+                ), '[]'::jsonb)
+            ));
+        end if;
+        idx := idx + 1;
+    end loop;
+
+    insert into makeup_classes (p_id, lr, start_time, end_time, day, course_name, course_day, course_start_time, course_end_time)
+    select x.p_id, x.lr, x.start_time, x.end_time, x.day, x.course_name, x.course_day, x.course_start_time, x.course_end_time
+    from jsonb_to_recordset(accepted) as x(
+        p_id text, lr text, day text, start_time text, end_time text,
+        course_name text, course_day text, course_start_time text, course_end_time text
+    );
+
+    insert into lr_reserved (lr, course_name, day, start_time, end_time)
+    select x.lr, x.course_name, x.day, x.start_time, x.end_time
+    from jsonb_to_recordset(accepted) as x(lr text, course_name text, day text, start_time text, end_time text);
+
+    return jsonb_build_object('results', results);
+end;
+$$;
@@ -0,0 +1,106 @@
+# /get-free-slots against the in-memory postgrest stand-in, seeded with
+# HH:MM:SS times the way postgrest returns time columns
+import os
+import sys
+import asyncio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import httpx
+import pytest
+from standins import InMemoryPostgrest
+from loadtest import environment
+from roster import RosterIndex
+from singleflight import SingleFlight
+
+
+@pytest.fixture
+def main(monkeypatch):
+    # main reads its settings on first import, they are only set for this test
+    for name, value in environment(8025, 4).items():
+        monkeypatch.setenv(name, value)
+    import main
+    # whatever a test rebinds is put back afterwards
+    monkeypatch.setattr(main, "availability", None)
+    monkeypatch.setattr(main, "free_slot_flights", SingleFlight())
+    monkeypatch.setattr(main.repo, "transport", main.repo.transport)
+    return main
+
+
+def seeded():
+    standin = InMemoryPostgrest()
+    sections = standin.seed(teachers=3, rooms=4, students=60)
+    for table in ("teachers_assigned_courses", "lr_reserved", "students_assigned_courses"):
+        for row in standin.tables[table]:
+            row["start_time"] += ":00"
+            row["end_time"] += ":00"
+    section = sections[0]
+    mails = standin._section_mails(section["course_name"], section["day"], section["start_time"], section["end_time"])
+    return standin, section, mails
+
+
+async def free_slots(main, standin, params):
+    main.repo.transport = httpx.ASGITransport(app=standin.app)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.get("/get-free-slots", params=params)
+    finally:
+        await main.repo.close()
+
+
+@pytest.mark.parametrize("engine", ["rpc", "local"])
+@pytest.mark.parametrize("spelling", [":00", ""])
+def test_section_times_reach_the_computation(main, monkeypatch, engine, spelling):
+    standin, section, mails = seeded()
+    monkeypatch.setattr(main, "FREE_SLOTS_ENGINE", engine)
+    params = {
+        "target_day": "Saturday",
+        "course_name": section["course_name"],
+        "course_day": section["day"],
+        "course_start_time": section["start_time"][:5] + spelling,
+        "course_end_time": section["end_time"][:5] + spelling,
+    }
+    res = asyncio.run(free_slots(main, standin, params))
+    assert res.status_code == 200
+    slots = [slot for room in res.json() for rows in room.values() for slot in rows]
+    assert mails and slots
+    assert {slot["total_students"] for slot in slots} == {len(mails)}
+
+
+@pytest.mark.parametrize("engine", ["rpc", "local"])
+@pytest.mark.parametrize("times", [("08:00", "08:00"), ("abc", "11:00"), ("11:00", "08:00")])
+def test_invalid_course_times_are_rejected(main, monkeypatch, engine, times):
+    standin, section, _ = seeded()
+    monkeypatch.setattr(main, "FREE_SLOTS_ENGINE", engine)
+    params = {
+        "target_day": "Saturday",
+        "course_name": section["course_name"],
+        "course_day": section["day"],
+        "course_start_time": times[0],
+        "course_end_time": times[1],
+    }
+    res = asyncio.run(free_slots(main, standin, params))
+    assert res.status_code == 400
+
+
+def test_local_engine_keeps_rooms_sorted_and_rereads_the_roster(main):
+    from availability import AvailabilityEngine
+    standin, section, mails = seeded()
+
+    async def run():
+        main.repo.transport = httpx.ASGITransport(app=standin.app)
+        engine = AvailabilityEngine(main.repo, RosterIndex(main.repo))
+        try:
+            await engine.load()
+            engine.reserve("0-new", "Saturday", "08:00", "11:00")
+            assert engine.rooms == sorted(engine.rooms, key=str)
+            assert engine.room_bits[engine.room_index["0-new"], engine.days["Saturday"]] != 0
+            standin.tables["students_assigned_courses"] = [row for row in standin.tables["students_assigned_courses"] if row["s_mail"] != mails[0]]
+            await engine.load()
+            return engine.section_mails(section["course_name"], section["day"], section["start_time"], section["end_time"])
+        finally:
+            await main.repo.close()
+
+    assert len(asyncio.run(run())) == len(mails) - 1
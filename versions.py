@@ -0,0 +1,121 @@
+# data versions behind the etags of the read endpoints. bookings and
+# cancellations bump the teacher's and the booked day's version, so a
+# matching If-None-Match can be answered with 304 before any query runs.
+# with CACHE_REDIS_URL set the counters live in redis and every worker sees
+# every bump; without it they are per process, which is only correct for a
+# single worker (ETAG_WINDOW then bounds how stale another worker can be)
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import secrets
+
+logger = logging.getLogger("versions")
+
+ETAG_WINDOW = int(os.environ.get("ETAG_WINDOW", "30"))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+
+
+class RedisCounters:
+    # needs the redis package, calls block so they run on a worker thread
+    prefix = "makeup-version:"
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+
+    def incr(self, name):
+        return self.redis.incr(self.prefix + name)
+
+    def get(self, name):
+        value = self.redis.get(self.prefix + name)
+        return int(value) if value is not None else 0
+
+
+class DataVersions:
+    def __init__(self, window=ETAG_WINDOW, backend=None):
+        self.window = window
+        self.backend = backend
+        # a restart forgets local counters, so every etag handed out before is
+        # retired. shared counters survive restarts and need every worker to
+        # produce the same tags
+        self.boot = "shared" if backend is not None else secrets.token_hex(4)
+        self.teachers = {}
+        self.days = {}
+        self.not_modified = 0
+
+    async def _bump(self, counters, name):
+        counters[name] = counters.get(name, 0) + 1
+        if self.backend is not None:
+            try:
+                counters[name] = await asyncio.to_thread(self.backend.incr, name)
+            except Exception as e:
+                logger.warning("shared version bump failed: %s", e)
+        return counters[name]
+
+    async def _read(self, counters, name):
+        if self.backend is not None:
+            try:
+                counters[name] = await asyncio.to_thread(self.backend.get, name)
+            except Exception as e:
+                # an unreadable version never matches, the client gets a 200
+                logger.warning("shared version read failed: %s", e)
+                return "unknown-" + secrets.token_hex(4)
+        return counters.get(name, 0)
+
+    async def bump_teacher(self, p_id):
+        return await self._bump(self.teachers, f"teacher:{p_id}")
+
+    async def bump_day(self, day):
+        return await self._bump(self.days, f"day:{day}")
+
+    async def day(self, day):
+        return await self._read(self.days, f"day:{day}")
+
+    def _epoch(self):
+        return int(time.time() // self.window) if self.window else 0
+
+    async def teacher_etag(self, kind, p_id):
+        version = await self._read(self.teachers, f"teacher:{p_id}")
+        return f'W/"{kind}-{self.boot}-{self._epoch()}-{version}-{_digest(p_id)}"'
+
+    async def day_etag(self, kind, day, *parts):
+        version = await self.day(day)
+        return f'W/"{kind}-{self.boot}-{self._epoch()}-{version}-{_digest(day, *parts)}"'
+
+    def matches(self, if_none_match, etag):
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # weak comparison: W/"x" and "x" are the same tag
+        if "*" in candidates or _strip_weak(etag) in {_strip_weak(tag) for tag in candidates}:
+            self.not_modified += 1
+            return True
+        return False
+
+    def stats(self):
+        return {
+            "teachers": len(self.teachers),
+            "days": len(self.days),
+            "not_modified": self.not_modified,
+            "shared": self.backend is not None,
+            "window_seconds": self.window,
+        }
+
+
+def _digest(*parts):
+    return hashlib.sha1("\x1f".join(parts).encode()).hexdigest()[:12]
+
+def _strip_weak(tag):
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def create_versions():
+    backend = None
+    if CACHE_REDIS_URL:
+        try:
+            backend = RedisCounters(CACHE_REDIS_URL)
+        except Exception as e:
+            logger.warning("shared versions disabled, etags are per worker: %s", e)
+    return DataVersions(backend=backend)